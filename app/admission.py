@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class AdaptiveConcurrencyLimiter:
+    """Adaptive concurrency limiter with a bounded, deadline-aware wait queue.
+
+    The limit follows an AIMD scheme: it grows by roughly one slot per window
+    of requests finishing under the target latency, and shrinks multiplicatively
+    when requests exceed it or fail. Callers that cannot get a slot wait in a
+    FIFO queue; if the queue is full or the wait exceeds ``queue_timeout`` the
+    request is rejected immediately instead of piling up on the DB pool.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        max_queue: int,
+        queue_timeout: float,
+        target_latency: float,
+        backoff_ratio: float = 0.9,
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+        self.backoff_ratio = backoff_ratio
+
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_latency = target_latency
+        self.rejected = 0
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed to run concurrently"""
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Acquire a slot, waiting up to ``queue_timeout``. Returns False on rejection."""
+        if self._inflight < self.limit and not self._waiters:
+            self._inflight += 1
+            return True
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the deadline expired
+                return True
+            waiter.cancel()
+            self.rejected += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self, latency: float, success: bool = True) -> None:
+        """Release a slot and feed the observed latency back into the limit"""
+        self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+        if not success or latency > self.target_latency:
+            self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+        elif self._inflight >= self.limit:
+            # Only grow when the limit is actually the bottleneck
+            self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+        self._release_slot()
+
+    def retry_after(self) -> int:
+        """Estimate in seconds until a rejected client is likely to be served"""
+        backlog = len(self._waiters) + self._inflight
+        estimate = self._avg_latency * backlog / max(self.limit, 1)
+        return max(1, math.ceil(estimate))
+
+    def _release_slot(self) -> None:
+        # Hand the slot straight to the oldest live waiter so queued requests
+        # are not overtaken by new arrivals.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                if self._inflight <= self.limit:
+                    waiter.set_result(None)
+                    return
+                self._waiters.appendleft(waiter)
+                break
+        self._inflight -= 1
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware that sheds load before requests reach the DB pool.
+
+    Reads (GET/HEAD/OPTIONS) and writes are limited independently so a burst
+    of writes cannot starve catalog reads. ``path_limiters`` give individual
+    paths their own limiter, e.g. long-polling endpoints that would otherwise
+    hold read slots while idle. Exempt paths such as ``/health`` bypass the
+    limiter entirely and are always served.
+    """
+
+    def __init__(
+        self,
+        app,
+        read_limiter: AdaptiveConcurrencyLimiter,
+        write_limiter: AdaptiveConcurrencyLimiter,
+        exempt_paths: Optional[Iterable[str]] = None,
+        path_limiters: Optional[Dict[str, AdaptiveConcurrencyLimiter]] = None,
+    ):
+        self.app = app
+        self.read_limiter = read_limiter
+        self.write_limiter = write_limiter
+        self.exempt_paths = frozenset(exempt_paths or ())
+        self.path_limiters = dict(path_limiters or {})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.path_limiters.get(scope["path"])
+        if limiter is None:
+            limiter = self.read_limiter if scope["method"] in READ_METHODS else self.write_limiter
+        if not await limiter.acquire():
+            logger.warning(
+                f"Shedding {scope['method']} {scope['path']}: {limiter.name} limiter saturated "
+                f"(limit={limiter.limit}, inflight={limiter.inflight}, queued={limiter.queued})"
+            )
+            await self._reject(send, limiter.retry_after())
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            limiter.release(time.perf_counter() - started, success=status_code < 500)
+
+    @staticmethod
+    async def _reject(send, retry_after: int) -> None:
+        body = b'{"detail":"Service overloaded, please retry later"}'
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
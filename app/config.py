@@ -1,5 +1,6 @@
 import os
 from functools import lru_cache
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
 
@@ -8,6 +9,8 @@ class Settings(BaseSettings):
     
     # Database settings
     database_url: str = "sqlite:///./golf_courses.db"  # Default to SQLite for local development
+    db_pool_size: int = 5          # Connections kept open per database (each shard has its own pool)
+    db_max_overflow: int = 10      # Extra connections opened under load; admission limits stay within both
     
     # API settings
     api_title: str = "Golf Course API"
@@ -18,6 +21,42 @@ class Settings(BaseSettings):
     environment: str = "development"
     debug: bool = True
     
+    # Sharded storage: when set, courses are hash-partitioned over these
+    # databases (JSON list) instead of using database_url. Append-only order.
+    shard_database_urls: List[str] = []
+    # Shard count before the last append, set until rebalance_shards.py is done
+    shard_migration_from: Optional[int] = None
+    
+    # Admission control / load shedding
+    admission_control_enabled: bool = True
+    admission_read_concurrency: int = 10   # Initial concurrent reads allowed
+    admission_write_concurrency: int = 5   # Initial concurrent writes allowed
+    admission_min_concurrency: int = 2
+    admission_max_concurrency: int = 50    # Per route class; reads + writes are also capped by the DB pool
+    admission_queue_size: int = 100        # Requests allowed to wait per route class
+    admission_queue_timeout_seconds: float = 2.0
+    admission_target_latency_ms: float = 250.0
+    admission_changes_concurrency: int = 20  # Concurrent change feed requests; long polls have their own fixed limit
+    admission_exempt_paths: List[str] = ["/", "/health", "/docs", "/redoc", "/openapi.json"]
+    
+    # Per-request profiling (disabled unless a token or sample rate is set)
+    profiling_token: Optional[str] = None      # Requests sending a matching X-Profile-Token are profiled
+    profiling_sample_rate: float = 0.0         # Fraction of requests profiled at random
+    profiling_interval_ms: float = 5.0         # Stack sampling interval
+    profiling_output_dir: str = "./profiles"
+    profiling_max_profiles: int = 100          # Oldest profiles are evicted beyond this
+    
+    # Change feed
+    changes_max_wait_seconds: int = 30
+    changes_poll_interval_ms: int = 500
+    
+    # Round ingestion (write-behind buffer)
+    round_ingest_batch_size: int = 500
+    round_ingest_flush_interval_ms: int = 200
+    round_ingest_max_pending: int = 50000
+    round_ingest_layout_cache_size: int = 10000   # Course layouts cached per worker (LRU)
+    round_ingest_layout_ttl_seconds: float = 5.0  # How long other workers may validate against old holes
+    
     # AWS settings (when deployed)
     aws_region: str = "us-east-1"
     
@@ -1,13 +1,24 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, delete, func, insert, select, text, tuple_, update
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from typing import List, Optional
-from uuid import UUID
+from sqlalchemy.orm import sessionmaker, Session, selectinload
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple, Union
+from uuid import UUID, uuid4
 import logging
+import sys
 
-from app.config import get_database_url
-from app.db_models import Base, GolfCourseDB, HoleDB
-from app.models import GolfCourse, Hole
+from app.config import get_database_url, get_settings
+from app.db_models import Base, CourseChangeDB, GolfCourseDB, HoleDB, RoundDB, code_point_collate
+from app.models import (
+    CourseChange,
+    GolfCourse,
+    GolfCourseBase,
+    GolfCourseUpdate,
+    Hole,
+    Round,
+    validate_hole_layout
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,21 +33,91 @@ engine = create_engine(
     echo=False,  # Set to True for SQL query logging
     pool_pre_ping=True,  # Verify connections before use
     pool_recycle=300,    # Recycle connections every 5 minutes
+    pool_size=get_settings().db_pool_size,
+    max_overflow=get_settings().db_max_overflow,
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-def create_tables():
+def create_tables(bind=None):
     """Create database tables"""
     try:
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=bind or engine)
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Error creating tables: {e}")
         raise
 
 
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string above every string starting with ``prefix``, by code point.
+
+    Returns None when there is no such bound (every character is the highest
+    code point), in which case only the lower bound applies.
+    """
+    while prefix and ord(prefix[-1]) == sys.maxunicode:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    next_code_point = ord(prefix[-1]) + 1
+    if 0xD800 <= next_code_point <= 0xDFFF:
+        # Surrogates cannot be encoded; the next character is U+E000
+        next_code_point = 0xE000
+    return prefix[:-1] + chr(next_code_point)
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Attach UTC to timestamps read back without an offset (SQLite drops it)"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def lock_change_log(db: Union[Session, Connection]):
+    """Make change log sequence order match commit order on PostgreSQL.
+
+    Sequence values are assigned at insert time but become visible at commit,
+    so concurrent writers can commit seq 11 before seq 10; a reader whose
+    cursor already passed 11 would never see 10. An EXCLUSIVE lock held from
+    the insert to the commit serializes appends while still admitting readers.
+    SQLite already serializes writers.
+    """
+    bind = db.get_bind() if isinstance(db, Session) else db
+    if bind.dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE course_changes IN EXCLUSIVE MODE"))
+
+
+def backfill_course_changes(session_factory=None):
+    """Seed the change log with existing courses if it has never been populated.
+
+    A populated log is compacted instead, dropping entries superseded by a
+    later change to the same course (logs written before appends compacted).
+    """
+    db = (session_factory or SessionLocal)()
+    try:
+        if db.query(CourseChangeDB.seq).first() is not None:
+            latest = select(func.max(CourseChangeDB.seq)).group_by(CourseChangeDB.course_id)
+            result = db.execute(delete(CourseChangeDB).where(CourseChangeDB.seq.not_in(latest)))
+            db.commit()
+            if result.rowcount:
+                logger.info(f"Compacted change log, removed {result.rowcount} superseded entries")
+            return
+        course_ids = [row.id for row in db.query(GolfCourseDB.id).all()]
+        if not course_ids:
+            return
+        lock_change_log(db)
+        db.add_all([CourseChangeDB(course_id=course_id, operation="upsert") for course_id in course_ids])
+        db.commit()
+        logger.info(f"Backfilled change log with {len(course_ids)} courses")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error backfilling change log: {e}")
+        raise
+    finally:
+        db.close()
+
+
 def get_db() -> Session:
     """Get database session"""
     db = SessionLocal()
@@ -52,15 +133,83 @@ class DatabaseService:
     def __init__(self, db: Session):
         self.db = db
     
+    def close(self):
+        """Release the underlying session"""
+        self.db.close()
+    
     def get_all_courses(self) -> List[GolfCourse]:
         """Get all golf courses"""
         try:
-            db_courses = self.db.query(GolfCourseDB).all()
+            db_courses = self.db.query(GolfCourseDB).options(selectinload(GolfCourseDB.holes)).all()
             return [self._convert_to_pydantic(course) for course in db_courses]
         except Exception as e:
             logger.error(f"Error getting all courses: {e}")
             raise
     
+    def get_courses_page(self, after: Optional[Tuple[str, UUID]], limit: int) -> List[GolfCourse]:
+        """Get one page of golf courses ordered by (name, id), keyset-paginated.
+        
+        ``after`` is the (name, id) of the last course on the previous page.
+        """
+        try:
+            name = code_point_collate(GolfCourseDB.name)
+            query = self.db.query(GolfCourseDB).options(selectinload(GolfCourseDB.holes))
+            if after is not None:
+                # A row comparison bounds a range scan on (name, id); the
+                # equivalent OR form cannot
+                query = query.filter(tuple_(name, GolfCourseDB.id) > tuple_(*after))
+            db_courses = query.order_by(name, GolfCourseDB.id).limit(limit).all()
+            return [self._convert_to_pydantic(course) for course in db_courses]
+        except Exception as e:
+            logger.error(f"Error getting courses page after {after}: {e}")
+            raise
+    
+    def get_courses_by_country(self, country: str) -> List[GolfCourse]:
+        """Get golf courses in a country, ordered by name"""
+        try:
+            db_courses = (
+                self.db.query(GolfCourseDB)
+                .options(selectinload(GolfCourseDB.holes))
+                .filter(GolfCourseDB.country == country)
+                .order_by(code_point_collate(GolfCourseDB.name))
+                .all()
+            )
+            return [self._convert_to_pydantic(course) for course in db_courses]
+        except Exception as e:
+            logger.error(f"Error getting courses in country '{country}': {e}")
+            raise
+    
+    def get_courses_by_name_prefix(self, prefix: str) -> List[GolfCourse]:
+        """Get golf courses whose name starts with ``prefix``, case-insensitively"""
+        try:
+            # A code point range rather than LIKE: SQLite only uses an index
+            # for LIKE on a plain column, PostgreSQL only under "C" collation
+            if self.db.get_bind().dialect.name == "sqlite":
+                # SQLite's lower() only folds ASCII letters
+                lower_prefix = "".join(c.lower() if c.isascii() else c for c in prefix)
+            else:
+                lower_prefix = prefix.lower()
+            lower_name = code_point_collate(func.lower(GolfCourseDB.name))
+            query = (
+                self.db.query(GolfCourseDB)
+                .options(selectinload(GolfCourseDB.holes))
+                .filter(lower_name >= lower_prefix)
+            )
+            upper_bound = _prefix_upper_bound(lower_prefix)
+            if upper_bound is not None:
+                query = query.filter(lower_name < upper_bound)
+            db_courses = query.all()
+            return [self._convert_to_pydantic(course) for course in db_courses]
+        except Exception as e:
+            logger.error(f"Error getting courses with name prefix '{prefix}': {e}")
+            raise
+    
+    def course_exists(self, course_id: UUID) -> bool:
+        """Check whether a golf course exists without loading it"""
+        return self.db.execute(
+            select(GolfCourseDB.id).where(GolfCourseDB.id == course_id)
+        ).first() is not None
+    
     def get_course_by_id(self, course_id: UUID) -> Optional[GolfCourse]:
         """Get a golf course by ID"""
         try:
@@ -72,76 +221,116 @@ class DatabaseService:
             logger.error(f"Error getting course by ID {course_id}: {e}")
             raise
     
-    def create_course(self, course: GolfCourse) -> GolfCourse:
-        """Create a new golf course"""
+    def create_course(self, course: GolfCourseBase, course_id: Optional[UUID] = None) -> GolfCourse:
+        """Create a new golf course.
+        
+        The validated request model is mapped straight to INSERT rows and the
+        response is built from the same data, so there is no ORM round trip.
+        """
         try:
-            # Create golf course
-            db_course = GolfCourseDB(
-                id=course.id,
-                name=course.name,
-                location=course.location,
-                country=course.country,
-                total_holes=course.total_holes
-            )
-            
-            self.db.add(db_course)
-            self.db.flush()  # Get the ID
+            if course_id is None:
+                course_id = course.id if isinstance(course, GolfCourse) else uuid4()
+            fields = {
+                "name": course.name,
+                "location": course.location,
+                "country": course.country,
+                "total_holes": course.total_holes
+            }
             
-            # Create holes
-            for hole in course.holes:
-                db_hole = HoleDB(
-                    golf_course_id=db_course.id,
-                    hole_number=hole.hole_number,
-                    par=hole.par,
-                    distance_meters=hole.distance_meters,
-                    handicap=hole.handicap
-                )
-                self.db.add(db_hole)
+            self.db.execute(insert(GolfCourseDB).values(id=course_id, **fields))
+            self.db.execute(insert(HoleDB), self._hole_rows(course_id, course.holes))
             
+            self._record_change(course_id, "upsert")
             self.db.commit()
-            self.db.refresh(db_course)
             
-            return self._convert_to_pydantic(db_course)
+            return GolfCourse.model_construct(
+                id=course_id, holes=self._order_holes(course.holes), **fields
+            )
         except Exception as e:
             self.db.rollback()
             logger.error(f"Error creating course: {e}")
             raise
     
-    def update_course(self, course_id: UUID, updated_course: GolfCourse) -> Optional[GolfCourse]:
-        """Update an existing golf course"""
+    def update_course(self, course_id: UUID, changes: GolfCourseUpdate) -> Optional[GolfCourse]:
+        """Apply a partial update to an existing golf course.
+        
+        Only the fields set on ``changes`` are written. Holes are replaced as a
+        whole when given, otherwise the stored holes must still match
+        ``total_holes``. Raises ValueError if the result would be inconsistent.
+        """
         try:
-            db_course = self.db.query(GolfCourseDB).filter(GolfCourseDB.id == course_id).first()
-            if not db_course:
+            row = self.db.execute(
+                select(
+                    GolfCourseDB.name,
+                    GolfCourseDB.location,
+                    GolfCourseDB.country,
+                    GolfCourseDB.total_holes
+                ).where(GolfCourseDB.id == course_id)
+            ).first()
+            if row is None:
                 return None
             
-            # Update course fields
-            db_course.name = updated_course.name
-            db_course.location = updated_course.location
-            db_course.country = updated_course.country
-            db_course.total_holes = updated_course.total_holes
+            fields = dict(row._mapping)
+            updates = {
+                key: value
+                for key, value in changes.model_dump(exclude_unset=True, exclude={"holes"}).items()
+                if value is not None
+            }
+            fields.update(updates)
             
-            # Delete existing holes and create new ones
-            self.db.query(HoleDB).filter(HoleDB.golf_course_id == course_id).delete()
+            if changes.holes is not None:
+                holes = changes.holes
+                validate_hole_layout(holes, fields["total_holes"])
+                self.db.execute(delete(HoleDB).where(HoleDB.golf_course_id == course_id))
+                self.db.execute(insert(HoleDB), self._hole_rows(course_id, holes))
+            else:
+                holes = [
+                    Hole.model_construct(**hole._mapping)
+                    for hole in self.db.execute(
+                        select(HoleDB.hole_number, HoleDB.par, HoleDB.distance_meters, HoleDB.handicap)
+                        .where(HoleDB.golf_course_id == course_id)
+                    )
+                ]
+                validate_hole_layout(holes, fields["total_holes"])
             
-            for hole in updated_course.holes:
-                db_hole = HoleDB(
-                    golf_course_id=course_id,
-                    hole_number=hole.hole_number,
-                    par=hole.par,
-                    distance_meters=hole.distance_meters,
-                    handicap=hole.handicap
-                )
-                self.db.add(db_hole)
+            if updates:
+                self.db.execute(update(GolfCourseDB).where(GolfCourseDB.id == course_id).values(**updates))
             
+            self._record_change(course_id, "upsert")
             self.db.commit()
-            self.db.refresh(db_course)
             
-            return self._convert_to_pydantic(db_course)
+            return GolfCourse.model_construct(id=course_id, holes=self._order_holes(holes), **fields)
+        except ValueError:
+            # Invalid client input, reported as 400 by the API; not a server error
+            self.db.rollback()
+            raise
         except Exception as e:
             self.db.rollback()
             logger.error(f"Error updating course {course_id}: {e}")
             raise
     
+    @staticmethod
+    def _hole_rows(course_id: UUID, holes: List[Hole]) -> List[dict]:
+        """Map validated holes to HoleDB insert rows"""
+        return [
+            {
+                "golf_course_id": course_id,
+                "hole_number": hole.hole_number,
+                "par": hole.par,
+                "distance_meters": hole.distance_meters,
+                "handicap": hole.handicap
+            }
+            for hole in holes
+        ]
+    
+    @staticmethod
+    def _order_holes(holes: List[Hole]) -> List[Hole]:
+        """Order holes already validated to be numbered 1..n, without sorting"""
+        ordered = [None] * len(holes)
+        for hole in holes:
+            ordered[hole.hole_number - 1] = hole
+        return ordered
+    
     def delete_course(self, course_id: UUID) -> bool:
         """Delete a golf course"""
         try:
@@ -149,7 +338,11 @@ class DatabaseService:
             if not db_course:
                 return False
             
+            # Rounds have no ORM relationship and SQLite does not enforce the
+            # foreign key's ON DELETE CASCADE
+            self.db.execute(delete(RoundDB).where(RoundDB.golf_course_id == course_id))
             self.db.delete(db_course)
+            self._record_change(course_id, "delete")
             self.db.commit()
             return True
         except Exception as e:
@@ -158,10 +351,14 @@ class DatabaseService:
             raise
     
     def search_courses(self, query: str) -> List[GolfCourse]:
-        """Search golf courses by name, location, or country"""
+        """Search golf courses by name, location, or country.
+        
+        Substring matching cannot use a B-tree index, so this scans the table;
+        prefer ``get_courses_by_name_prefix`` or ``get_courses_by_country``.
+        """
         try:
             search_pattern = f"%{query.lower()}%"
-            db_courses = self.db.query(GolfCourseDB).filter(
+            db_courses = self.db.query(GolfCourseDB).options(selectinload(GolfCourseDB.holes)).filter(
                 (GolfCourseDB.name.ilike(search_pattern)) |
                 (GolfCourseDB.location.ilike(search_pattern)) |
                 (GolfCourseDB.country.ilike(search_pattern))
@@ -172,6 +369,113 @@ class DatabaseService:
             logger.error(f"Error searching courses with query '{query}': {e}")
             raise
     
+    def get_changes_since(self, since: int, limit: int = 100) -> Tuple[List[CourseChange], int, bool]:
+        """Get course changes after the ``since`` cursor.
+
+        Only the latest change per course within the page is returned, since
+        clients only need the current state. Returns the changes, the cursor
+        to resume from and whether more changes are already available.
+        """
+        try:
+            db_changes = (
+                self.db.query(CourseChangeDB)
+                .filter(CourseChangeDB.seq > since)
+                .order_by(CourseChangeDB.seq)
+                .limit(limit + 1)
+                .all()
+            )
+            has_more = len(db_changes) > limit
+            db_changes = db_changes[:limit]
+            if not db_changes:
+                return [], since, False
+            
+            latest = {change.course_id: change for change in db_changes}
+            upserted_ids = [cid for cid, change in latest.items() if change.operation == "upsert"]
+            courses = {}
+            if upserted_ids:
+                db_courses = (
+                    self.db.query(GolfCourseDB)
+                    .options(selectinload(GolfCourseDB.holes))
+                    .filter(GolfCourseDB.id.in_(upserted_ids))
+                    .all()
+                )
+                courses = {course.id: self._convert_to_pydantic(course) for course in db_courses}
+            
+            changes = []
+            for change in sorted(latest.values(), key=lambda c: c.seq):
+                course = courses.get(change.course_id)
+                if change.operation == "upsert" and course is None:
+                    # Deleted after this page's snapshot; its tombstone follows later
+                    continue
+                changes.append(CourseChange(
+                    seq=change.seq,
+                    course_id=change.course_id,
+                    operation=change.operation,
+                    changed_at=_as_utc(change.changed_at),
+                    data=course
+                ))
+            
+            return changes, db_changes[-1].seq, has_more
+        except Exception as e:
+            logger.error(f"Error getting changes since {since}: {e}")
+            raise
+    
+    def _record_change(self, course_id: UUID, operation: str):
+        """Append an entry to the change log in the current transaction.
+
+        Earlier entries for the course are deleted, so the log holds one entry
+        per course (tombstones included) and a full sync from ``since=0``
+        costs the catalog size, not the length of the history.
+
+        Must be the last write before commit: pending row changes are flushed
+        first so the change log lock is never held while waiting on row locks.
+        """
+        self.db.flush()
+        lock_change_log(self.db)
+        self.db.execute(delete(CourseChangeDB).where(CourseChangeDB.course_id == course_id))
+        self.db.add(CourseChangeDB(course_id=course_id, operation=operation))
+    
+    def get_round_by_id(self, round_id: UUID) -> Optional[Round]:
+        """Get a round by ID"""
+        try:
+            db_round = self.db.query(RoundDB).filter(RoundDB.id == round_id).first()
+            if db_round:
+                return self._convert_round_to_pydantic(db_round)
+            return None
+        except Exception as e:
+            logger.error(f"Error getting round by ID {round_id}: {e}")
+            raise
+    
+    def get_course_rounds(self, course_id: UUID, limit: int = 100, offset: int = 0) -> List[Round]:
+        """Get rounds played on a course, best net score first"""
+        try:
+            db_rounds = (
+                self.db.query(RoundDB)
+                .filter(RoundDB.golf_course_id == course_id)
+                .order_by(RoundDB.net, RoundDB.id)
+                .offset(offset)
+                .limit(limit)
+                .all()
+            )
+            return [self._convert_round_to_pydantic(r) for r in db_rounds]
+        except Exception as e:
+            logger.error(f"Error getting rounds for course {course_id}: {e}")
+            raise
+    
+    def _convert_round_to_pydantic(self, db_round: RoundDB) -> Round:
+        """Convert SQLAlchemy round model to Pydantic model"""
+        return Round(
+            id=db_round.id,
+            player_name=db_round.player_name,
+            golf_course_id=db_round.golf_course_id,
+            played_on=db_round.played_on,
+            course_handicap=db_round.course_handicap,
+            strokes=list(db_round.strokes),
+            gross=db_round.gross,
+            net=db_round.net,
+            score_to_par=db_round.score_to_par
+        )
+    
     def _convert_to_pydantic(self, db_course: GolfCourseDB) -> GolfCourse:
         """Convert SQLAlchemy model to Pydantic model"""
         holes = [
@@ -194,11 +498,11 @@ class DatabaseService:
         )
 
 
-def init_sample_data():
+def init_sample_data(db_service=None):
     """Initialize database with sample data"""
+    if db_service is None:
+        db_service = DatabaseService(SessionLocal())
     try:
-        db = SessionLocal()
-        db_service = DatabaseService(db)
         
         # Check if data already exists
         existing_courses = db_service.get_all_courses()
@@ -271,4 +575,4 @@ def init_sample_data():
         logger.error(f"Error initializing sample data: {e}")
         raise
     finally:
-        db.close()
+        db_service.close()
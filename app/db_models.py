@@ -1,25 +1,61 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, Date, DateTime, LargeBinary, Index, func
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.expression import FunctionElement
+from datetime import datetime, timezone
 import uuid
 
 Base = declarative_base()
 
 
+class code_point_collate(FunctionElement):
+    """Compare and order a string expression by code point.
+
+    Renders ``expr COLLATE "C"`` on PostgreSQL, whose default collation is
+    locale-aware; SQLite's BINARY collation already orders by code point. Use
+    it both in index definitions and in the queries those indexes serve.
+    """
+    type = String()
+    name = "code_point_collate"
+    inherit_cache = True
+
+
+@compiles(code_point_collate)
+def _compile_code_point_collate(element, compiler, **kw):
+    return compiler.process(element.clauses.clauses[0], **kw)
+
+
+@compiles(code_point_collate, "postgresql")
+def _compile_code_point_collate_postgresql(element, compiler, **kw):
+    return f'{compiler.process(element.clauses.clauses[0], **kw)} COLLATE "C"'
+
+
 class GolfCourseDB(Base):
     """SQLAlchemy model for golf courses"""
     __tablename__ = "golf_courses"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    name = Column(String(200), nullable=False, index=True)
+    name = Column(String(200), nullable=False)
     location = Column(String(100), nullable=False)
-    country = Column(String(50), nullable=False, index=True)
+    country = Column(String(50), nullable=False)
     total_holes = Column(Integer, nullable=False, default=18)
     description = Column(Text, nullable=True)
     
     # Relationship to holes
     holes = relationship("HoleDB", back_populates="golf_course", cascade="all, delete-orphan")
+    
+    # Names are indexed and ordered by code point so every database, and the
+    # merge across shards, agrees on one order
+    __table_args__ = (
+        # Keyset pagination by (name, id)
+        Index("ix_golf_courses_name_id", code_point_collate(name), id),
+        # Case-insensitive name prefix lookups (range scans by code point)
+        Index("ix_golf_courses_lower_name", code_point_collate(func.lower(name))),
+        # Country filter returned in name order; also serves country-only lookups
+        Index("ix_golf_courses_country_name", country, code_point_collate(name)),
+    )
 
 
 class HoleDB(Base):
@@ -36,5 +72,59 @@ class HoleDB(Base):
     # Relationship to golf course
     golf_course = relationship("GolfCourseDB", back_populates="holes")
     
+    __table_args__ = (
+        # Foreign key lookups, returned in hole order
+        Index("ix_holes_golf_course_id_hole_number", golf_course_id, hole_number),
+    )
+    
     def __repr__(self):
         return f"<Hole(course_id={self.golf_course_id}, number={self.hole_number}, par={self.par})>"
+
+
+class RoundDB(Base):
+    """SQLAlchemy model for a played round.
+
+    Per-hole strokes are packed one byte per hole (ordered by hole number)
+    instead of a row per hole, and the computed results are stored alongside
+    so leaderboards never need to unpack them.
+    """
+    __tablename__ = "rounds"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    golf_course_id = Column(UUID(as_uuid=True), ForeignKey("golf_courses.id", ondelete="CASCADE"), nullable=False)
+    player_name = Column(String(100), nullable=False, index=True)
+    played_on = Column(Date, nullable=False)
+    course_handicap = Column(Integer, nullable=False, default=0)
+    strokes = Column(LargeBinary, nullable=False)
+    gross = Column(Integer, nullable=False)
+    net = Column(Integer, nullable=False)
+    score_to_par = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        # Per-course leaderboard, best net first
+        Index("ix_rounds_golf_course_id_net", golf_course_id, net, id),
+    )
+    
+    def __repr__(self):
+        return f"<Round(course_id={self.golf_course_id}, player={self.player_name}, gross={self.gross})>"
+
+
+class CourseChangeDB(Base):
+    """SQLAlchemy model for the course change log.
+
+    Every create, update and delete appends a row in the same transaction as
+    the write, so ``seq`` doubles as a monotonically increasing sync cursor
+    (appends are serialized on PostgreSQL, see ``lock_change_log``).
+    Appending removes the course's earlier entries, leaving one per course.
+    Deletes are recorded as tombstones; there is deliberately no foreign key
+    to ``golf_courses`` so they outlive the course.
+    """
+    __tablename__ = "course_changes"
+    
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    course_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    operation = Column(String(10), nullable=False)  # "upsert" or "delete"
+    changed_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f"<CourseChange(seq={self.seq}, course_id={self.course_id}, operation={self.operation})>"
@@ -0,0 +1,337 @@
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+import logging
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.db_models import GolfCourseDB, HoleDB, RoundDB
+from app.models import RoundCreate
+from app.sharding import CourseMigratingError
+
+logger = logging.getLogger(__name__)
+
+
+class CourseNotFoundError(ValueError):
+    """Raised when a round references a course that does not exist"""
+
+
+class IngestionBufferFull(RuntimeError):
+    """Raised when the write-behind buffer cannot accept more rounds"""
+
+
+# Upper bound for the back-off between retries of a failing batch write
+MAX_RETRY_DELAY = 30.0
+
+
+class CourseLayout:
+    """Per-hole par and stroke-index arrays for one course, ordered by hole number"""
+
+    __slots__ = ("par", "stroke_rank", "total_par")
+
+    def __init__(self, pars: List[int], handicaps: List[int]):
+        self.par = np.asarray(pars, dtype=np.int16)
+        # Rank holes by difficulty (0 = hardest) so 9-hole courses whose
+        # handicaps are not exactly 1..9 still allocate strokes correctly.
+        self.stroke_rank = np.argsort(np.argsort(np.asarray(handicaps), kind="stable"), kind="stable").astype(np.int16)
+        self.total_par = int(self.par.sum())
+
+    @property
+    def holes(self) -> int:
+        return len(self.par)
+
+
+def compute_results(
+    layout: CourseLayout, strokes: np.ndarray, course_handicaps: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Compute gross, net and score to par for a batch of rounds on one course.
+
+    ``strokes`` is an (n_rounds, n_holes) matrix and ``course_handicaps`` an
+    (n_rounds,) vector. Handicap strokes are allocated per hole by stroke index:
+    every hole receives ``handicap // holes`` strokes and the hardest
+    ``handicap % holes`` holes receive one more.
+    """
+    holes = layout.holes
+    gross = strokes.sum(axis=1, dtype=np.int32)
+    base, extra = np.divmod(course_handicaps, holes)
+    received = base[:, None] + (layout.stroke_rank[None, :] < extra[:, None])
+    net = (strokes - received).sum(axis=1, dtype=np.int32)
+    score_to_par = gross - layout.total_par
+    return gross, net, score_to_par
+
+
+class RoundIngestionBuffer:
+    """Write-behind buffer that batches round inserts into few transactions.
+
+    Request handlers validate a round against the cached course layout and
+    enqueue it together with that layout; a background thread drains the queue every ``flush_interval``
+    seconds (or as soon as ``batch_size`` rounds are pending), computes the
+    results for the whole batch with numpy and writes it with one executemany
+    INSERT per transaction. With a ``router`` (see ``app.sharding``) each round
+    is written to its course's shard, one transaction per shard per batch.
+
+    A batch whose transaction fails is put back at the front of the queue and
+    retried with exponential back-off. While writes are failing, ``submit``
+    rejects new rounds so the API stops accepting data it cannot store.
+
+    At most ``layout_cache_size`` layouts are cached, least recently used
+    first out, and each for ``layout_ttl`` seconds, which bounds
+    how long a worker that did not handle a course update keeps validating
+    against the old holes. Rounds are scored with the layout they were
+    validated against, and rounds whose course is gone by the time the batch
+    is written are dropped.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        batch_size: int = 500,
+        flush_interval: float = 0.2,
+        max_pending: int = 50000,
+        layout_ttl: float = 5.0,
+        layout_cache_size: int = 10000,
+        router=None,
+    ):
+        self.session_factory = session_factory
+        self.router = router
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.layout_ttl = layout_ttl
+        self.layout_cache_size = layout_cache_size
+
+        self._pending: List[Tuple[UUID, RoundCreate, CourseLayout]] = []
+        self._condition = threading.Condition()
+        self._layouts: "OrderedDict[UUID, Tuple[CourseLayout, float]]" = OrderedDict()
+        self._layouts_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._consecutive_failures = 0
+        self.rounds_written = 0
+        self.write_failures = 0
+        self.rounds_dropped = 0
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="round-ingestion", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread after writing everything still pending"""
+        if self._thread is None:
+            return
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, rounds: List[RoundCreate]) -> List[UUID]:
+        """Validate and enqueue rounds, returning their pre-assigned IDs"""
+        layouts = []
+        for round_data in rounds:
+            layout = self.get_layout(round_data.golf_course_id)
+            if len(round_data.strokes) != layout.holes:
+                raise ValueError(
+                    f"Number of strokes ({len(round_data.strokes)}) doesn't match course holes ({layout.holes})"
+                )
+            layouts.append(layout)
+
+        ids = [uuid4() for _ in rounds]
+        with self._condition:
+            if self._consecutive_failures:
+                raise IngestionBufferFull("Round storage is unavailable, retry later")
+            if len(self._pending) + len(rounds) > self.max_pending:
+                raise IngestionBufferFull("Round ingestion buffer is full")
+            self._pending.extend(zip(ids, rounds, layouts))
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+        return ids
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def stats(self) -> Dict[str, object]:
+        """Counters for health checks and monitoring"""
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "rounds_written": self.rounds_written,
+                "write_failures": self.write_failures,
+                "rounds_dropped": self.rounds_dropped,
+                "failing": self._consecutive_failures > 0,
+            }
+
+    def get_layout(self, course_id: UUID) -> CourseLayout:
+        """Get the cached hole layout for a course, loading it when missing or expired"""
+        with self._layouts_lock:
+            cached = self._layouts.get(course_id)
+            if cached is not None and time.monotonic() - cached[1] < self.layout_ttl:
+                self._layouts.move_to_end(course_id)
+                return cached[0]
+
+        db = self._session_for(course_id)
+        try:
+            holes = (
+                db.query(HoleDB.par, HoleDB.handicap)
+                .filter(HoleDB.golf_course_id == course_id)
+                .order_by(HoleDB.hole_number)
+                .all()
+            )
+        finally:
+            db.close()
+        if not holes:
+            if self._awaiting_move(course_id):
+                raise CourseMigratingError(f"Golf course {course_id} is being moved to another shard")
+            raise CourseNotFoundError(f"Golf course {course_id} not found")
+
+        layout = CourseLayout([h.par for h in holes], [h.handicap for h in holes])
+        with self._layouts_lock:
+            self._layouts[course_id] = (layout, time.monotonic())
+            self._layouts.move_to_end(course_id)
+            while len(self._layouts) > self.layout_cache_size:
+                self._layouts.popitem(last=False)
+        return layout
+
+    def _awaiting_move(self, course_id: UUID) -> bool:
+        """Whether a shard migration has yet to copy the course to its owner"""
+        previous = self.router.previous_shard_for(course_id) if self.router is not None else None
+        if previous is None:
+            return False
+        db = self.router.session_factories[previous]()
+        try:
+            return db.execute(select(GolfCourseDB.id).where(GolfCourseDB.id == course_id)).first() is not None
+        finally:
+            db.close()
+
+    def _session_for(self, course_id: UUID) -> Session:
+        if self.router is not None:
+            return self.router.session_for(course_id)
+        return self.session_factory()
+
+    def invalidate_course(self, course_id: UUID):
+        """Drop a cached layout after its course was updated or deleted"""
+        with self._layouts_lock:
+            self._layouts.pop(course_id, None)
+
+    def flush(self) -> int:
+        """Write all pending rounds synchronously. Returns the number written.
+
+        Stops at the first failed batch, which stays queued for the next flush.
+        """
+        written = 0
+        while True:
+            with self._condition:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+            if not batch:
+                return written
+            failures = self.write_failures
+            written += self._write_batch(batch)
+            if self.write_failures != failures:
+                return written
+            with self._condition:
+                self._consecutive_failures = 0
+
+    def _retry_delay(self) -> float:
+        if not self._consecutive_failures:
+            return self.flush_interval
+        return min(self.flush_interval * 2 ** self._consecutive_failures, MAX_RETRY_DELAY)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._running and (self._consecutive_failures or len(self._pending) < self.batch_size):
+                    self._condition.wait(self._retry_delay())
+                running = self._running
+            self.flush()
+            if not running:
+                lost = self.pending()
+                if lost:
+                    logger.error(f"Stopped with {lost} rounds that could not be written")
+                return
+
+    def _write_batch(self, batch: List[Tuple[UUID, RoundCreate, CourseLayout]]) -> int:
+        # Rounds for one course can carry different layouts if the course
+        # changed while they were queued; each group is scored with its own
+        by_layout: Dict[Tuple[UUID, int], List[Tuple[UUID, RoundCreate, CourseLayout]]] = defaultdict(list)
+        for item in batch:
+            by_layout[(item[1].golf_course_id, id(item[2]))].append(item)
+
+        rows_by_shard: Dict[int, List[dict]] = defaultdict(list)
+        items_by_shard: Dict[int, List[Tuple[UUID, RoundCreate, CourseLayout]]] = defaultdict(list)
+        for (course_id, _), items in by_layout.items():
+            layout = items[0][2]
+            strokes = np.array([r.strokes for _, r, _ in items], dtype=np.int16)
+            handicaps = np.array([r.course_handicap for _, r, _ in items], dtype=np.int32)
+            gross, net, to_par = compute_results(layout, strokes, handicaps)
+
+            shard = self.router.shard_for(course_id) if self.router is not None else 0
+            items_by_shard[shard].extend(items)
+            rows = rows_by_shard[shard]
+            for i, (round_id, r, _) in enumerate(items):
+                rows.append({
+                    "id": round_id,
+                    "golf_course_id": course_id,
+                    "player_name": r.player_name,
+                    "played_on": r.played_on,
+                    "course_handicap": r.course_handicap,
+                    "strokes": strokes[i].astype(np.uint8).tobytes(),
+                    "gross": int(gross[i]),
+                    "net": int(net[i]),
+                    "score_to_par": int(to_par[i]),
+                })
+
+        return sum(
+            self._insert_rows(shard, rows, items_by_shard[shard])
+            for shard, rows in rows_by_shard.items()
+        )
+
+    def _insert_rows(
+        self, shard: int, rows: List[dict], items: List[Tuple[UUID, RoundCreate, CourseLayout]]
+    ) -> int:
+        if self.router is not None:
+            db = self.router.session_factories[shard]()
+        else:
+            db = self.session_factory()
+        started = time.perf_counter()
+        try:
+            # Checked in the write transaction: SQLite does not enforce the
+            # foreign key, so rounds for a deleted course would be orphaned
+            course_ids = {row["golf_course_id"] for row in rows}
+            existing = set(db.execute(
+                select(GolfCourseDB.id).where(GolfCourseDB.id.in_(course_ids))
+            ).scalars())
+            for course_id in course_ids - existing:
+                dropped = sum(1 for row in rows if row["golf_course_id"] == course_id)
+                logger.warning(f"Dropping {dropped} rounds for deleted course {course_id}")
+                self.invalidate_course(course_id)
+            kept = [row for row in rows if row["golf_course_id"] in existing]
+            if kept:
+                db.execute(insert(RoundDB), kept)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            with self._condition:
+                # Requeue ahead of newer rounds
+                self._pending[:0] = items
+                self._consecutive_failures += 1
+                self.write_failures += 1
+            logger.error(f"Error writing batch of {len(rows)} rounds, retrying in {self._retry_delay():.1f}s: {e}")
+            return 0
+        finally:
+            db.close()
+
+        with self._condition:
+            self.rounds_written += len(kept)
+            self.rounds_dropped += len(rows) - len(kept)
+        logger.debug(f"Wrote {len(kept)} rounds in {(time.perf_counter() - started) * 1000:.1f}ms")
+        return len(kept)
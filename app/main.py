@@ -1,19 +1,37 @@
 from fastapi import FastAPI, HTTPException, Query, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 from uuid import UUID
+import asyncio
+import base64
+import json
 import os
+import time
 
 from app.models import (
-    GolfCourse,
     GolfCourseCreate,
     GolfCourseUpdate,
     GolfCourseResponse,
-    GolfCoursesListResponse
+    GolfCoursesListResponse,
+    CourseChangesResponse,
+    RoundCreate,
+    RoundResponse,
+    RoundsListResponse
 )
 from app.config import get_settings
-from app.database_new import get_db, DatabaseService, create_tables, init_sample_data
+from app.admission import AdaptiveConcurrencyLimiter, AdmissionControlMiddleware
+from app.profiling import ProfiledRoute, ProfileStore, ProfilingMiddleware, install_sql_hooks
+from app.database_new import (
+    engine,
+    DatabaseService,
+    SessionLocal,
+    create_tables,
+    init_sample_data,
+    backfill_course_changes
+)
+from app.ingestion import RoundIngestionBuffer, CourseNotFoundError, IngestionBufferFull
+from app.sharding import CourseMigratingError, ShardRouter, ShardedDatabaseService
 from app.database import db as memory_db  # Fallback for development
 
 settings = get_settings()
@@ -26,6 +44,73 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Optional hash-partitioned storage across several databases
+shard_router = ShardRouter(
+    settings.shard_database_urls,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    previous_num_shards=settings.shard_migration_from,
+) if settings.shard_database_urls else None
+
+# Opt-in profiling; nothing is installed when it is not configured
+if settings.profiling_token or settings.profiling_sample_rate > 0:
+    # Must be set before the routes below are declared
+    app.router.route_class = ProfiledRoute
+    for profiled_engine in (shard_router.engines if shard_router else [engine]):
+        install_sql_hooks(profiled_engine)
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=ProfileStore(settings.profiling_output_dir, settings.profiling_max_profiles),
+        token=settings.profiling_token,
+        sample_rate=settings.profiling_sample_rate,
+        interval=settings.profiling_interval_ms / 1000,
+    )
+
+# Shed load before requests queue up on the DB connection pool (added before
+# CORS so rejections still carry CORS headers)
+if settings.admission_control_enabled:
+    # Reads and writes together must not outgrow the connection pool, or the
+    # limiter admits requests that then queue on pool checkout. One connection
+    # is left for the round ingestion flush thread; the pool capacity is split
+    # in proportion to the initial read and write limits.
+    pool_budget = max(2, settings.db_pool_size + settings.db_max_overflow - 1)
+    initial_total = settings.admission_read_concurrency + settings.admission_write_concurrency
+    write_max = max(1, round(pool_budget * settings.admission_write_concurrency / initial_total))
+    write_max = min(write_max, pool_budget - 1)
+    max_concurrency = {"read": pool_budget - write_max, "write": write_max}
+
+    def _build_limiter(name: str, initial_limit: int) -> AdaptiveConcurrencyLimiter:
+        max_limit = min(settings.admission_max_concurrency, max_concurrency[name])
+        return AdaptiveConcurrencyLimiter(
+            name=name,
+            initial_limit=initial_limit,
+            min_limit=min(settings.admission_min_concurrency, max_limit),
+            max_limit=max_limit,
+            max_queue=settings.admission_queue_size,
+            queue_timeout=settings.admission_queue_timeout_seconds,
+            target_latency=settings.admission_target_latency_ms / 1000,
+        )
+
+    # Long polls would hold read slots while idle, and their latency is the
+    # wait time, so the change feed gets a fixed limit of its own
+    changes_limiter = AdaptiveConcurrencyLimiter(
+        name="changes",
+        initial_limit=settings.admission_changes_concurrency,
+        min_limit=settings.admission_changes_concurrency,
+        max_limit=settings.admission_changes_concurrency,
+        max_queue=settings.admission_queue_size,
+        queue_timeout=settings.admission_queue_timeout_seconds,
+        target_latency=settings.changes_max_wait_seconds,
+    )
+
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        read_limiter=_build_limiter("read", settings.admission_read_concurrency),
+        write_limiter=_build_limiter("write", settings.admission_write_concurrency),
+        exempt_paths=settings.admission_exempt_paths,
+        path_limiters={"/golf-courses/changes": changes_limiter},
+    )
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,25 +120,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Write-behind buffer for round ingestion
+round_buffer = RoundIngestionBuffer(
+    SessionLocal,
+    batch_size=settings.round_ingest_batch_size,
+    flush_interval=settings.round_ingest_flush_interval_ms / 1000,
+    max_pending=settings.round_ingest_max_pending,
+    layout_ttl=settings.round_ingest_layout_ttl_seconds,
+    layout_cache_size=settings.round_ingest_layout_cache_size,
+    router=shard_router,
+)
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
     try:
-        # Create tables
-        create_tables()
-        
-        # Initialize sample data only if not in production
-        if settings.environment != "production":
-            init_sample_data()
+        if shard_router is not None:
+            shard_router.create_tables()
+            if settings.environment != "production":
+                init_sample_data(ShardedDatabaseService(shard_router))
+            for session_factory in shard_router.session_factories:
+                backfill_course_changes(session_factory)
+        else:
+            # Create tables
+            create_tables()
+            
+            # Initialize sample data only if not in production
+            if settings.environment != "production":
+                init_sample_data()
+            
+            backfill_course_changes()
             
     except Exception as e:
         print(f"Error during startup: {e}")
         # Continue anyway - the app might still work
+    
+    round_buffer.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Flush buffered rounds before shutting down"""
+    round_buffer.stop()
 
-def get_database_service(db: Session = Depends(get_db)) -> DatabaseService:
-    """Get database service instance"""
-    return DatabaseService(db)
+def get_database_service() -> DatabaseService:
+    """Get database service instance, sharded when shard URLs are configured"""
+    if shard_router is not None:
+        db_service = ShardedDatabaseService(shard_router)
+    else:
+        db_service = DatabaseService(SessionLocal())
+    try:
+        yield db_service
+    finally:
+        db_service.close()
 
 def get_fallback_service():
     """Get fallback in-memory database service"""
@@ -74,18 +194,50 @@ async def root():
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "message": "API is running"}
+    return {"status": "healthy", "message": "API is running", "ingestion": round_buffer.stats()}
+
+
+def _encode_cursor(name: str, course_id: UUID) -> str:
+    """Encode a (name, id) keyset position as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps([name, str(course_id)]).encode()).decode()
+
+
+def _decode_cursor(cursor: Optional[str]):
+    """Decode a cursor from _encode_cursor, or None for the first page"""
+    if cursor is None:
+        return None
+    try:
+        name, course_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return name, UUID(course_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @app.get("/golf-courses", response_model=GolfCoursesListResponse, tags=["Golf Courses"])
-async def get_all_golf_courses(
+def get_all_golf_courses(
     search: Optional[str] = Query(None, description="Search by name, location, or country"),
+    country: Optional[str] = Query(None, description="Filter by exact country name"),
+    name_prefix: Optional[str] = Query(None, min_length=1, description="Filter by name prefix (case-insensitive)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size for the unfiltered listing"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     db_service: DatabaseService = Depends(get_database_service)
 ):
-    """Get all golf courses with optional search"""
+    """Get all golf courses with optional search or filters"""
+    if country and name_prefix:
+        raise HTTPException(status_code=400, detail="country and name_prefix cannot be combined")
     try:
+        next_cursor = None
         if search:
             courses = db_service.search_courses(search)
+        elif country:
+            courses = db_service.get_courses_by_country(country)
+        elif name_prefix:
+            courses = db_service.get_courses_by_name_prefix(name_prefix)
+        elif limit is not None or cursor is not None:
+            limit = limit or 100
+            courses = db_service.get_courses_page(_decode_cursor(cursor), limit)
+            if len(courses) == limit:
+                next_cursor = _encode_cursor(courses[-1].name, courses[-1].id)
         else:
             courses = db_service.get_all_courses()
         
@@ -93,14 +245,89 @@ async def get_all_golf_courses(
             success=True,
             message="Golf courses retrieved successfully",
             data=courses,
-            total=len(courses)
+            total=len(courses),
+            next_cursor=next_cursor
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+def _decode_changes_cursor(since: str):
+    """Decode a change feed cursor: an integer sequence value, or one per shard.
+
+    On sharded storage the cursor is an opaque encoding of the per-shard
+    vector; ``0`` starts every shard from the beginning. Shards appended since
+    the cursor was issued start from the beginning as well.
+    """
+    try:
+        if shard_router is None:
+            cursor = int(since)
+            if cursor < 0:
+                raise ValueError(since)
+            return cursor
+        if since == "0":
+            return [0] * shard_router.num_shards
+        cursor = [int(seq) for seq in json.loads(base64.urlsafe_b64decode(since.encode()))]
+        if len(cursor) > shard_router.num_shards or any(seq < 0 for seq in cursor):
+            raise ValueError(since)
+        return cursor + [0] * (shard_router.num_shards - len(cursor))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _encode_changes_cursor(cursor):
+    if isinstance(cursor, list):
+        return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+    return cursor
+
+
+def _fetch_changes(since, limit: int):
+    """Read a page of the change feed with short-lived sessions"""
+    if shard_router is not None:
+        db_service = ShardedDatabaseService(shard_router)
+    else:
+        db_service = DatabaseService(SessionLocal())
+    try:
+        return db_service.get_changes_since(since, limit)
+    finally:
+        db_service.close()
+
+
+@app.get("/golf-courses/changes", response_model=CourseChangesResponse, tags=["Golf Courses"])
+async def get_golf_course_changes(
+    since: str = Query("0", description="Cursor returned as next_cursor by the previous call; 0 to start"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of changes to return"),
+    wait: int = Query(0, ge=0, description="Seconds to long-poll when there are no changes"),
+):
+    """Get golf courses created, updated or deleted since a cursor"""
+    since = _decode_changes_cursor(since)
+    try:
+        wait = min(wait, settings.changes_max_wait_seconds)
+        deadline = time.monotonic() + wait
+        while True:
+            # No DB connection is held between polls
+            changes, next_cursor, has_more = await run_in_threadpool(_fetch_changes, since, limit)
+            remaining = deadline - time.monotonic()
+            if next_cursor != since or remaining <= 0:
+                break
+            await asyncio.sleep(min(settings.changes_poll_interval_ms / 1000, remaining))
+        
+        return CourseChangesResponse(
+            success=True,
+            message="Golf course changes retrieved successfully",
+            data=changes,
+            total=len(changes),
+            next_cursor=_encode_changes_cursor(next_cursor),
+            has_more=has_more
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 @app.get("/golf-courses/{course_id}", response_model=GolfCourseResponse, tags=["Golf Courses"])
-async def get_golf_course(
+def get_golf_course(
     course_id: UUID,
     db_service: DatabaseService = Depends(get_database_service)
 ):
@@ -122,31 +349,14 @@ async def get_golf_course(
 
 
 @app.post("/golf-courses", response_model=GolfCourseResponse, tags=["Golf Courses"])
-async def create_golf_course(
+def create_golf_course(
     course_data: GolfCourseCreate,
     db_service: DatabaseService = Depends(get_database_service)
 ):
     """Create a new golf course"""
     try:
-        # Validate that the number of holes matches total_holes
-        if len(course_data.holes) != course_data.total_holes:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Number of holes ({len(course_data.holes)}) doesn't match total_holes ({course_data.total_holes})"
-            )
-        
-        # Validate hole numbers are sequential and unique
-        hole_numbers = [hole.hole_number for hole in course_data.holes]
-        expected_numbers = list(range(1, course_data.total_holes + 1))
-        if sorted(hole_numbers) != expected_numbers:
-            raise HTTPException(
-                status_code=400,
-                detail="Hole numbers must be sequential from 1 to total_holes"
-            )
-        
-        # Create golf course with auto-generated ID
-        new_course = GolfCourse(**course_data.model_dump())
-        created_course = db_service.create_course(new_course)
+        # Hole layout is already checked by GolfCourseCreate's validator
+        created_course = db_service.create_course(course_data)
         
         return GolfCourseResponse(
             success=True,
@@ -162,41 +372,17 @@ async def create_golf_course(
 
 
 @app.put("/golf-courses/{course_id}", response_model=GolfCourseResponse, tags=["Golf Courses"])
-async def update_golf_course(
+def update_golf_course(
     course_id: UUID,
     course_data: GolfCourseUpdate,
     db_service: DatabaseService = Depends(get_database_service)
 ):
     """Update an existing golf course"""
     try:
-        # Check if course exists
-        existing_course = db_service.get_course_by_id(course_id)
-        if not existing_course:
+        result = db_service.update_course(course_id, course_data)
+        if not result:
             raise HTTPException(status_code=404, detail="Golf course not found")
-        
-        # Create updated course data
-        update_data = course_data.model_dump(exclude_unset=True)
-        updated_course_data = existing_course.model_dump()
-        updated_course_data.update(update_data)
-        
-        # Validate holes if provided
-        if course_data.holes is not None and course_data.total_holes is not None:
-            if len(course_data.holes) != course_data.total_holes:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Number of holes ({len(course_data.holes)}) doesn't match total_holes ({course_data.total_holes})"
-                )
-            
-            hole_numbers = [hole.hole_number for hole in course_data.holes]
-            expected_numbers = list(range(1, course_data.total_holes + 1))
-            if sorted(hole_numbers) != expected_numbers:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Hole numbers must be sequential from 1 to total_holes"
-                )
-        
-        updated_course = GolfCourse(**updated_course_data)
-        result = db_service.update_course(course_id, updated_course)
+        round_buffer.invalidate_course(course_id)
         
         return GolfCourseResponse(
             success=True,
@@ -205,12 +391,16 @@ async def update_golf_course(
         )
     except HTTPException:
         raise
+    except CourseMigratingError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 @app.delete("/golf-courses/{course_id}", tags=["Golf Courses"])
-async def delete_golf_course(
+def delete_golf_course(
     course_id: UUID,
     db_service: DatabaseService = Depends(get_database_service)
 ):
@@ -219,6 +409,7 @@ async def delete_golf_course(
         success = db_service.delete_course(course_id)
         if not success:
             raise HTTPException(status_code=404, detail="Golf course not found")
+        round_buffer.invalidate_course(course_id)
         
         return {
             "success": True,
@@ -226,12 +417,14 @@ async def delete_golf_course(
         }
     except HTTPException:
         raise
+    except CourseMigratingError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 @app.get("/golf-courses/{course_id}/holes", tags=["Holes"])
-async def get_course_holes(
+def get_course_holes(
     course_id: UUID,
     db_service: DatabaseService = Depends(get_database_service)
 ):
@@ -254,7 +447,7 @@ async def get_course_holes(
 
 
 @app.get("/golf-courses/{course_id}/holes/{hole_number}", tags=["Holes"])
-async def get_specific_hole(
+def get_specific_hole(
     course_id: UUID,
     hole_number: int,
     db_service: DatabaseService = Depends(get_database_service)
@@ -277,4 +470,92 @@ async def get_specific_hole(
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+def _enqueue_rounds(rounds: List[RoundCreate]) -> List[UUID]:
+    """Submit rounds to the ingestion buffer, mapping errors to HTTP responses"""
+    try:
+        return round_buffer.submit(rounds)
+    except CourseNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (IngestionBufferFull, CourseMigratingError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/rounds", status_code=202, tags=["Rounds"])
+def submit_round(round_data: RoundCreate):
+    """Submit a round for asynchronous ingestion"""
+    try:
+        round_id = _enqueue_rounds([round_data])[0]
+        return {
+            "success": True,
+            "message": "Round accepted for ingestion",
+            "data": {"id": round_id}
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@app.post("/rounds/batch", status_code=202, tags=["Rounds"])
+def submit_rounds(rounds: List[RoundCreate]):
+    """Submit many rounds at once for asynchronous ingestion"""
+    try:
+        round_ids = _enqueue_rounds(rounds)
+        return {
+            "success": True,
+            "message": f"{len(round_ids)} rounds accepted for ingestion",
+            "data": [{"id": round_id} for round_id in round_ids],
+            "total": len(round_ids)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@app.get("/rounds/{round_id}", response_model=RoundResponse, tags=["Rounds"])
+def get_round(
+    round_id: UUID,
+    db_service: DatabaseService = Depends(get_database_service)
+):
+    """Get a specific round by ID"""
+    try:
+        round_result = db_service.get_round_by_id(round_id)
+        if not round_result:
+            raise HTTPException(status_code=404, detail="Round not found")
+        
+        return RoundResponse(
+            success=True,
+            message="Round retrieved successfully",
+            data=round_result
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@app.get("/golf-courses/{course_id}/rounds", response_model=RoundsListResponse, tags=["Rounds"])
+def get_course_rounds(
+    course_id: UUID,
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of rounds to return"),
+    offset: int = Query(0, ge=0, description="Number of rounds to skip"),
+    db_service: DatabaseService = Depends(get_database_service)
+):
+    """Get rounds played on a course, ordered by net score"""
+    try:
+        rounds = db_service.get_course_rounds(course_id, limit=limit, offset=offset)
+        
+        return RoundsListResponse(
+            success=True,
+            message="Rounds retrieved successfully",
+            data=rounds,
+            total=len(rounds)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import Annotated, List, Literal, Optional, Union
+from datetime import date, datetime
 from uuid import UUID, uuid4
 
 
@@ -11,6 +12,17 @@ class Hole(BaseModel):
     handicap: int = Field(..., ge=1, le=18, description="Handicap rating (1-18)")
 
 
+def validate_hole_layout(holes: List[Hole], total_holes: int) -> None:
+    """Check that holes are numbered exactly 1..total_holes, in any order"""
+    if len(holes) != total_holes:
+        raise ValueError(f"Number of holes ({len(holes)}) doesn't match total_holes ({total_holes})")
+    seen = [False] * (total_holes + 1)
+    for hole in holes:
+        if hole.hole_number > total_holes or seen[hole.hole_number]:
+            raise ValueError("Hole numbers must be sequential from 1 to total_holes")
+        seen[hole.hole_number] = True
+
+
 class GolfCourseBase(BaseModel):
     """Base model for golf course data"""
     name: str = Field(..., min_length=1, max_length=200, description="Golf course name")
@@ -22,7 +34,11 @@ class GolfCourseBase(BaseModel):
 
 class GolfCourseCreate(GolfCourseBase):
     """Model for creating a new golf course"""
-    pass
+    
+    @model_validator(mode="after")
+    def check_holes(self):
+        validate_hole_layout(self.holes, self.total_holes)
+        return self
 
 
 class GolfCourseUpdate(BaseModel):
@@ -32,6 +48,13 @@ class GolfCourseUpdate(BaseModel):
     country: Optional[str] = Field(None, min_length=1, max_length=50)
     total_holes: Optional[int] = Field(None, ge=9, le=18)
     holes: Optional[List[Hole]] = None
+    
+    @model_validator(mode="after")
+    def check_holes(self):
+        # Partial updates are checked against the stored course by the service
+        if self.holes is not None and self.total_holes is not None:
+            validate_hole_layout(self.holes, self.total_holes)
+        return self
 
 
 class GolfCourse(GolfCourseBase):
@@ -55,3 +78,60 @@ class GolfCoursesListResponse(BaseModel):
     message: str
     data: List[GolfCourse]
     total: int
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page")
+
+
+class CourseChange(BaseModel):
+    """A single entry in the course change feed"""
+    seq: int = Field(..., description="Position in the change log")
+    course_id: UUID
+    operation: Literal["upsert", "delete"]
+    changed_at: datetime
+    data: Optional[GolfCourse] = Field(None, description="Current course state, omitted for deletes")
+
+
+class CourseChangesResponse(BaseModel):
+    """Response model for the course change feed"""
+    success: bool
+    message: str
+    data: List[CourseChange]
+    total: int
+    next_cursor: Union[int, str] = Field(
+        ...,
+        description="Pass as `since` to fetch the following changes (opaque string on sharded storage)"
+    )
+    has_more: bool = Field(..., description="Whether more changes are available right away")
+
+
+class RoundCreate(BaseModel):
+    """Model for submitting a played round"""
+    player_name: str = Field(..., min_length=1, max_length=100, description="Player name")
+    golf_course_id: UUID = Field(..., description="Course the round was played on")
+    played_on: date = Field(default_factory=date.today, description="Date the round was played")
+    course_handicap: int = Field(0, ge=0, le=54, description="Player's course handicap")
+    strokes: List[Annotated[int, Field(ge=1, le=20)]] = Field(
+        ..., min_length=9, max_length=18, description="Strokes per hole, ordered by hole number"
+    )
+
+
+class Round(RoundCreate):
+    """Model representing a stored round with computed results"""
+    id: UUID = Field(..., description="Unique identifier")
+    gross: int = Field(..., description="Total strokes")
+    net: int = Field(..., description="Gross minus handicap strokes received")
+    score_to_par: int = Field(..., description="Gross relative to course par")
+
+
+class RoundResponse(BaseModel):
+    """Response model for single round responses"""
+    success: bool
+    message: str
+    data: Optional[Round] = None
+
+
+class RoundsListResponse(BaseModel):
+    """Response model for round list endpoints"""
+    success: bool
+    message: str
+    data: List[Round]
+    total: int
@@ -0,0 +1,351 @@
+import asyncio
+import functools
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from types import FrameType
+from typing import Callable, Dict, List, Optional
+from uuid import uuid4
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    """Sampled call stacks, phase timings and SQL timings for a single request.
+
+    Only threads attached to the profile are sampled. Sync endpoints attach
+    their threadpool thread when they start (see :class:`ProfiledRoute`), and
+    any thread running SQL in the request's context attaches itself (see
+    :func:`install_sql_hooks`). A thread stays attached while the frame it was
+    running at that point is still on its stack, so threadpool workers that
+    later serve other requests are not sampled.
+
+    The event loop thread is shared by all requests and is never sampled.
+    Work done there or outside the endpoint (request parsing and validation,
+    dependencies, response validation and serialization) shows up in the
+    phase timings instead.
+    """
+
+    def __init__(self, method: str, path: str, interval: float, max_statements: int = 500):
+        self.id = uuid4().hex
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.max_statements = max_statements
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.statements: List[Dict] = []
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.status_code: Optional[int] = None
+        self.marks: Dict[str, float] = {}
+        self._threads: Dict[int, FrameType] = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profiler-{self.id[:8]}", daemon=True)
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        """Signal the sampler to stop without waiting for it (safe on the event loop)"""
+        self.duration = time.perf_counter() - self.started
+        self._stop.set()
+
+    def mark(self, name: str):
+        """Record when a request phase was reached, relative to the start"""
+        self.marks.setdefault(name, time.perf_counter() - self.started)
+
+    def attach_current_thread(self, anchor: Optional[FrameType] = None):
+        """Sample the calling thread until ``anchor`` returns.
+
+        ``anchor`` defaults to the outermost application frame on the stack.
+        """
+        if anchor is None:
+            frame = sys._getframe(1)
+            while frame is not None:
+                filename = frame.f_code.co_filename
+                if filename.startswith(APP_DIR) and filename != __file__:
+                    anchor = frame
+                frame = frame.f_back
+        if anchor is not None:
+            self._threads[threading.get_ident()] = anchor
+
+    def record_statement(self, statement: str, duration: float):
+        if len(self.statements) < self.max_statements:
+            self.statements.append({"statement": statement, "duration_ms": round(duration * 1000, 3)})
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, anchor in list(self._threads.items()):
+                frame = frames.get(ident)
+                stack = []
+                attached = False
+                while frame is not None:
+                    code = frame.f_code
+                    attached = attached or frame is anchor
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if attached:
+                    self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def phases(self) -> Dict[str, float]:
+        """Durations in ms between the recorded marks, for the phases that were reached"""
+        marks = dict(self.marks, response_finished=self.marks.get("response_finished", self.duration))
+        boundaries = [
+            ("before_endpoint", "handler_started", "endpoint_started"),
+            ("endpoint", "endpoint_started", "endpoint_finished"),
+            ("after_endpoint", "endpoint_finished", "response_started"),
+            ("response_send", "response_started", "response_finished"),
+        ]
+        return {
+            name: round((marks[end] - marks[start]) * 1000, 3)
+            for name, start, end in boundaries
+            if start in marks and end in marks
+        }
+
+    def to_dict(self, max_stacks: int = 200) -> Dict:
+        """Finish the profile and export it; blocks until the sampler exits"""
+        self._sampler.join()
+        self._threads.clear()
+        sql_total = sum(s["duration_ms"] for s in self.statements)
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "duration_ms": round(self.duration * 1000, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            # before_endpoint: request parsing, validation and dependencies;
+            # after_endpoint: response validation and serialization
+            "phases_ms": self.phases(),
+            # Folded "file:function;file:function" stacks, ready for flamegraph tools
+            "stacks": dict(self.stacks.most_common(max_stacks)),
+            "sql_statements": len(self.statements),
+            "sql_total_ms": round(sql_total, 3),
+            "sql": self.statements,
+        }
+
+
+def install_sql_hooks(engine: Engine):
+    """Time SQL statements issued while a profile is active.
+
+    The thread issuing the statement is attached to the profile so its stacks
+    are sampled. Only installed when profiling is configured, so unprofiled
+    deployments do not pay for the event listeners.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.attach_current_thread()
+            conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = _current_profile.get()
+        if profile is not None and conn.info.get("profile_query_start"):
+            started = conn.info["profile_query_start"].pop()
+            profile.record_statement(statement, time.perf_counter() - started)
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    """Wrap an endpoint so the active profile records when it runs"""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed_async_endpoint(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            profile.mark("endpoint_started")
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.mark("endpoint_finished")
+
+        return timed_async_endpoint
+
+    @functools.wraps(endpoint)
+    def timed_endpoint(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        profile.mark("endpoint_started")
+        # Sync endpoints run on a threadpool thread of their own
+        profile.attach_current_thread(anchor=sys._getframe())
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.mark("endpoint_finished")
+
+    return timed_endpoint
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that records request phase timings on the active profile.
+
+    Set as the router's ``route_class`` before routes are declared; only done
+    when profiling is configured.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            profile = _current_profile.get()
+            if profile is not None:
+                profile.mark("handler_started")
+            return await handler(request)
+
+        return timed_handler
+
+
+class ProfileStore:
+    """Bounded on-disk ring buffer of profiles; the oldest files are evicted first"""
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, profile: Dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        filename = f"{time.time_ns()}-{profile['id']}.json"
+        path = os.path.join(self.directory, filename)
+        with open(path, "w") as f:
+            json.dump(profile, f)
+        with self._lock:
+            files = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+            for name in files[:max(0, len(files) - self.max_profiles)]:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+        return path
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles sampled or explicitly authorized requests.
+
+    A request is profiled when it carries ``X-Profile-Token`` matching the
+    configured token, or when it is picked by ``sample_rate``. The profile is
+    saved to the :class:`ProfileStore` and referenced by the ``X-Profile-Id``
+    response header; authorized requests sending ``X-Profile: inline`` get the
+    profile back as the response body instead, with the original response
+    embedded.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+    ):
+        self.app = app
+        self.store = store
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        authorized = self.token is not None and hmac.compare_digest(
+            headers.get(b"x-profile-token", b""), self.token
+        )
+        if not authorized and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        inline = authorized and headers.get(b"x-profile", b"").lower() == b"inline"
+        profile = RequestProfile(scope["method"], scope["path"], self.interval)
+        token = _current_profile.set(profile)
+        start_message = None
+        body_parts: List[bytes] = []
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                profile.mark("response_finished")
+            if message["type"] == "http.response.start":
+                profile.mark("response_started")
+                profile.status_code = message["status"]
+                start_message = message
+                if not inline:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-profile-id", profile.id.encode())
+                    ]
+                    await send(message)
+            elif inline and message["type"] == "http.response.body":
+                body_parts.append(message.get("body", b""))
+            else:
+                await send(message)
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.stop()
+            _current_profile.reset(token)
+
+        # Joins the sampler thread, so kept off the event loop
+        result = await run_in_threadpool(profile.to_dict)
+        if inline:
+            await self._send_inline(send, start_message, b"".join(body_parts), result)
+            return
+
+        try:
+            await run_in_threadpool(self.store.save, result)
+        except Exception as e:
+            logger.error(f"Error saving profile {profile.id}: {e}")
+
+    @staticmethod
+    async def _send_inline(send, start_message, body: bytes, profile: Dict):
+        original_headers = dict(start_message.get("headers", [])) if start_message else {}
+        if original_headers.get(b"content-type", b"").startswith(b"application/json"):
+            response = json.loads(body or b"null")
+        else:
+            response = body.decode(errors="replace")
+        payload = json.dumps({
+            "status_code": profile["status_code"],
+            "response": response,
+            "profile": profile,
+        }, default=str).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+                (b"x-profile-id", profile["id"].encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": payload})
@@ -0,0 +1,276 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple, TypeVar
+from uuid import UUID, uuid4
+import contextvars
+import heapq
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, Session
+
+from app.database_new import DatabaseService, create_tables
+from app.models import CourseChange, GolfCourse, GolfCourseBase, GolfCourseUpdate, Round
+
+T = TypeVar("T")
+
+
+class CourseMigratingError(RuntimeError):
+    """Raised when writing to a course that a shard migration has not moved yet"""
+
+
+def jump_consistent_hash(key: int, num_buckets: int) -> int:
+    """Map a 64-bit key to a bucket (Lamping & Veach).
+
+    When a bucket is appended, only the keys that move to the new bucket
+    change assignment, so adding a shard relocates about 1/N of the courses.
+    """
+    bucket, candidate = -1, 0
+    while candidate < num_buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(course_id: UUID, num_shards: int) -> int:
+    """Shard index owning a course"""
+    value = course_id.int
+    return jump_consistent_hash((value >> 64) ^ (value & 0xFFFFFFFFFFFFFFFF), num_shards)
+
+
+class ShardRouter:
+    """Engines and session factories for a fixed, ordered list of shards.
+
+    The order of ``database_urls`` is part of the placement function: new
+    shards must be appended, and existing data moved with
+    ``scripts/rebalance_shards.py``. While that runs, ``previous_num_shards``
+    is the shard count before the append: courses not moved yet are still
+    found on their previous owner.
+    """
+
+    def __init__(
+        self,
+        database_urls: List[str],
+        max_workers: Optional[int] = None,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        previous_num_shards: Optional[int] = None,
+    ):
+        if not database_urls:
+            raise ValueError("At least one shard database URL is required")
+        if previous_num_shards is not None and not 0 < previous_num_shards < len(database_urls):
+            raise ValueError("The previous shard count must be below the number of shard URLs")
+        self.previous_num_shards = previous_num_shards
+        self.engines = [
+            create_engine(
+                url, pool_pre_ping=True, pool_recycle=300, pool_size=pool_size, max_overflow=max_overflow
+            )
+            for url in database_urls
+        ]
+        self.session_factories = [
+            sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+            for shard_engine in self.engines
+        ]
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or 4 * len(database_urls), thread_name_prefix="shard-fanout"
+        )
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.engines)
+
+    def shard_for(self, course_id: UUID) -> int:
+        return shard_for(course_id, self.num_shards)
+
+    def session_for(self, course_id: UUID) -> Session:
+        """Open a session on the shard owning a course"""
+        return self.session_factories[self.shard_for(course_id)]()
+
+    def previous_shard_for(self, course_id: UUID) -> Optional[int]:
+        """During a migration, the shard a course lived on before, if it moves"""
+        if self.previous_num_shards is None:
+            return None
+        previous = shard_for(course_id, self.previous_num_shards)
+        return None if previous == self.shard_for(course_id) else previous
+
+    def create_tables(self):
+        for shard_engine in self.engines:
+            create_tables(bind=shard_engine)
+
+
+class ShardedDatabaseService:
+    """DatabaseService spread over several databases by course ID.
+
+    Point reads and writes go to the owning shard only. List and search calls
+    fan out to every shard in parallel on the router's thread pool and merge
+    the results. Rounds live on the shard of their course. Sessions are opened
+    lazily, one per shard touched, and released by :meth:`close`.
+
+    During a migration (see :class:`ShardRouter`) point reads fall back to a
+    course's previous shard, writes to courses that have not been moved yet
+    raise :class:`CourseMigratingError`, and listings drop the duplicate seen
+    while a course is being copied.
+
+    ``get_all_courses``, ``search_courses`` and the filters are unbounded:
+    every shard returns all of its matches and they are merged in memory, so
+    large catalogs should be listed with ``get_courses_page``.
+    """
+
+    def __init__(self, router: ShardRouter):
+        self.router = router
+        self._services: List[Optional[DatabaseService]] = [None] * router.num_shards
+
+    def close(self):
+        """Release every shard session opened by this service"""
+        for service in self._services:
+            if service is not None:
+                service.close()
+        self._services = [None] * self.router.num_shards
+
+    def _shard(self, index: int) -> DatabaseService:
+        if self._services[index] is None:
+            self._services[index] = DatabaseService(self.router.session_factories[index]())
+        return self._services[index]
+
+    def _owner(self, course_id: UUID) -> DatabaseService:
+        return self._shard(self.router.shard_for(course_id))
+
+    def _previous_owner(self, course_id: UUID) -> Optional[DatabaseService]:
+        previous = self.router.previous_shard_for(course_id)
+        return None if previous is None else self._shard(previous)
+
+    def _check_not_migrating(self, course_id: UUID):
+        """Refuse a write missing on the owner while the course awaits its move"""
+        previous = self._previous_owner(course_id)
+        if previous is not None and previous.course_exists(course_id):
+            raise CourseMigratingError(f"Golf course {course_id} is being moved to another shard")
+
+    def _fan_out(self, call: Callable[[DatabaseService], T]) -> List[T]:
+        """Run ``call`` against every shard in parallel, in shard order.
+
+        Each call runs in a copy of the caller's context, so request-scoped
+        state such as the active profile follows it onto the pool threads.
+        """
+        return self._fan_out_indexed(lambda index, shard: call(shard))
+
+    def _fan_out_indexed(self, call: Callable[[int, DatabaseService], T]) -> List[T]:
+        """Like :meth:`_fan_out`, passing each shard's index along with it"""
+        shards = [self._shard(index) for index in range(self.router.num_shards)]
+        if len(shards) == 1:
+            return [call(0, shards[0])]
+        futures = [
+            self.router.executor.submit(contextvars.copy_context().run, call, index, shard)
+            for index, shard in enumerate(shards)
+        ]
+        return [future.result() for future in futures]
+
+    def get_all_courses(self) -> List[GolfCourse]:
+        """Get all golf courses from every shard, ordered by (name, id)"""
+        results = self._fan_out(lambda shard: shard.get_all_courses())
+        return _unique(sorted((course for courses in results for course in courses), key=_course_key))
+
+    def get_courses_page(self, after: Optional[Tuple[str, UUID]], limit: int) -> List[GolfCourse]:
+        """Get one keyset page across shards.
+
+        Every shard returns its own first ``limit`` courses after the cursor;
+        merging those sorted runs and keeping the first ``limit`` gives exactly
+        the page a single database would return. Shards order names by code
+        point (see ``code_point_collate``), which is also Python's string order.
+        """
+        results = self._fan_out(lambda shard: shard.get_courses_page(after, limit))
+        return _unique(heapq.merge(*results, key=_course_key))[:limit]
+
+    def get_courses_by_country(self, country: str) -> List[GolfCourse]:
+        results = self._fan_out(lambda shard: shard.get_courses_by_country(country))
+        return _unique(heapq.merge(*results, key=lambda course: course.name))
+
+    def get_courses_by_name_prefix(self, prefix: str) -> List[GolfCourse]:
+        results = self._fan_out(lambda shard: shard.get_courses_by_name_prefix(prefix))
+        return _unique(sorted((course for courses in results for course in courses), key=_course_key))
+
+    def search_courses(self, query: str) -> List[GolfCourse]:
+        results = self._fan_out(lambda shard: shard.search_courses(query))
+        return _unique(sorted((course for courses in results for course in courses), key=_course_key))
+
+    def get_course_by_id(self, course_id: UUID) -> Optional[GolfCourse]:
+        course = self._owner(course_id).get_course_by_id(course_id)
+        previous = self._previous_owner(course_id)
+        if course is None and previous is not None:
+            course = previous.get_course_by_id(course_id)
+        return course
+
+    def create_course(self, course: GolfCourseBase, course_id: Optional[UUID] = None) -> GolfCourse:
+        # The ID decides placement, so it is assigned before routing
+        if course_id is None:
+            course_id = course.id if isinstance(course, GolfCourse) else uuid4()
+        return self._owner(course_id).create_course(course, course_id=course_id)
+
+    def update_course(self, course_id: UUID, changes: GolfCourseUpdate) -> Optional[GolfCourse]:
+        result = self._owner(course_id).update_course(course_id, changes)
+        if result is None:
+            self._check_not_migrating(course_id)
+        return result
+
+    def delete_course(self, course_id: UUID) -> bool:
+        deleted = self._owner(course_id).delete_course(course_id)
+        if not deleted:
+            self._check_not_migrating(course_id)
+        return deleted
+
+    def get_changes_since(self, since: List[int], limit: int = 100) -> Tuple[List[CourseChange], List[int], bool]:
+        """Get course changes after a cursor holding one sequence value per shard.
+
+        Every shard returns up to ``limit`` changes after its own position.
+        The merged changes are ordered by time and cut to ``limit``, and each
+        shard's position only advances past the changes returned from it.
+        Returns the changes, the advanced cursor vector and whether more
+        changes are already available.
+        """
+        results = self._fan_out_indexed(lambda index, shard: shard.get_changes_since(since[index], limit))
+        # merge keeps each shard's changes in seq order, so what is kept from
+        # a shard is always a prefix of its changes
+        merged = list(heapq.merge(
+            *([(change.changed_at, index, change) for change in changes]
+              for index, (changes, _, _) in enumerate(results)),
+            key=lambda entry: entry[:2],
+        ))
+        kept = merged[:limit]
+        kept_per_shard = [0] * len(results)
+        last_kept = list(since)
+        for _, index, change in kept:
+            kept_per_shard[index] += 1
+            last_kept[index] = change.seq
+
+        cursor = []
+        for index, (changes, last_seq, _) in enumerate(results):
+            # A shard whose changes were all returned advances past the rows it
+            # scanned; otherwise only past its last returned change
+            cursor.append(last_seq if kept_per_shard[index] == len(changes) else last_kept[index])
+        has_more = len(merged) > limit or any(shard_has_more for _, _, shard_has_more in results)
+        return [change for _, _, change in kept], cursor, has_more
+
+    def get_round_by_id(self, round_id: UUID) -> Optional[Round]:
+        # Round IDs carry no placement information, so every shard is asked
+        results = self._fan_out(lambda shard: shard.get_round_by_id(round_id))
+        return next((result for result in results if result is not None), None)
+
+    def get_course_rounds(self, course_id: UUID, limit: int = 100, offset: int = 0) -> List[Round]:
+        shard = self._owner(course_id)
+        previous = self._previous_owner(course_id)
+        if previous is not None and not shard.course_exists(course_id):
+            shard = previous
+        return shard.get_course_rounds(course_id, limit=limit, offset=offset)
+
+
+def _course_key(course: GolfCourse) -> Tuple[str, UUID]:
+    return course.name, course.id
+
+
+def _unique(courses: Iterable[GolfCourse]) -> List[GolfCourse]:
+    """Drop repeated courses, which exist on two shards while being moved"""
+    seen = set()
+    unique = []
+    for course in courses:
+        if course.id not in seen:
+            seen.add(course.id)
+            unique.append(course)
+    return unique
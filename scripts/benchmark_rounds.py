@@ -0,0 +1,128 @@
+"""Benchmark sustained round ingestion throughput.
+
+Submits rounds from several producer threads through the write-behind
+buffer into a scratch SQLite database (or DATABASE_URL when given with
+--database-url) and reports accepted and persisted rounds per second.
+
+Usage:
+    python scripts/benchmark_rounds.py --seconds 10 --producers 4
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app.db_models import Base, GolfCourseDB, HoleDB, RoundDB
+from app.ingestion import RoundIngestionBuffer
+from app.models import RoundCreate
+
+
+def create_course(session_factory, holes: int = 18):
+    """Insert a course with a random but valid layout and return its ID"""
+    db = session_factory()
+    try:
+        course = GolfCourseDB(name="Benchmark Links", location="Benchmark", country="Nowhere", total_holes=holes)
+        db.add(course)
+        db.flush()
+        handicaps = random.sample(range(1, holes + 1), holes)
+        for number in range(1, holes + 1):
+            db.add(HoleDB(
+                golf_course_id=course.id,
+                hole_number=number,
+                par=random.choice((3, 4, 4, 5)),
+                distance_meters=random.randint(120, 520),
+                handicap=handicaps[number - 1]
+            ))
+        db.commit()
+        return course.id
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--producers", type=int, default=4)
+    parser.add_argument("--request-size", type=int, default=1, help="Rounds per submit call")
+    parser.add_argument("--courses", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-interval-ms", type=int, default=200)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    scratch = None
+    if database_url is None:
+        scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        scratch.close()
+        database_url = f"sqlite:///{scratch.name}"
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    course_ids = [create_course(session_factory) for _ in range(args.courses)]
+    buffer = RoundIngestionBuffer(
+        session_factory,
+        batch_size=args.batch_size,
+        flush_interval=args.flush_interval_ms / 1000,
+        max_pending=max(args.batch_size * 100, 50000),
+    )
+    buffer.start()
+
+    accepted = [0] * args.producers
+    deadline = time.perf_counter() + args.seconds
+
+    def produce(index: int):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            rounds = [
+                RoundCreate(
+                    player_name=f"player-{rng.randint(1, 10000)}",
+                    golf_course_id=rng.choice(course_ids),
+                    course_handicap=rng.randint(0, 36),
+                    strokes=[rng.randint(2, 9) for _ in range(18)]
+                )
+                for _ in range(args.request_size)
+            ]
+            try:
+                buffer.submit(rounds)
+                accepted[index] += len(rounds)
+            except Exception:
+                time.sleep(0.001)
+
+    started = time.perf_counter()
+    producers = [threading.Thread(target=produce, args=(i,)) for i in range(args.producers)]
+    for thread in producers:
+        thread.start()
+    for thread in producers:
+        thread.join()
+    buffer.stop()
+    elapsed = time.perf_counter() - started
+
+    db = session_factory()
+    try:
+        persisted = db.query(func.count(RoundDB.id)).scalar()
+    finally:
+        db.close()
+
+    print(f"database:        {database_url.split('@')[-1]}")
+    print(f"elapsed:         {elapsed:.2f}s (including final flush)")
+    print(f"accepted:        {sum(accepted)} rounds ({sum(accepted) / args.seconds:,.0f}/s)")
+    print(f"persisted:       {persisted} rounds ({persisted / elapsed:,.0f}/s)")
+
+    engine.dispose()
+    if scratch is not None:
+        os.remove(scratch.name)
+
+
+if __name__ == "__main__":
+    main()
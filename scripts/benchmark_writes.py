@@ -0,0 +1,122 @@
+"""Benchmark golf course create/update latency and allocations.
+
+Runs the same steps as the POST and PUT handlers (request validation,
+DatabaseService write, response serialization) against a scratch SQLite
+database. Latency is measured first without tracing; peak and retained
+allocations per operation are measured in a second pass under tracemalloc.
+
+Usage:
+    python scripts/benchmark_writes.py --iterations 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database_new import DatabaseService
+from app.db_models import Base
+from app.models import GolfCourseCreate, GolfCourseResponse, GolfCourseUpdate
+
+
+def course_payload(rng: random.Random, holes: int = 18) -> dict:
+    handicaps = rng.sample(range(1, holes + 1), holes)
+    return {
+        "name": f"Benchmark Course {rng.randint(1, 10 ** 6)}",
+        "location": "Benchmark",
+        "country": "Nowhere",
+        "total_holes": holes,
+        "holes": [
+            {
+                "hole_number": number,
+                "par": rng.choice((3, 4, 4, 5)),
+                "distance_meters": rng.randint(120, 520),
+                "handicap": handicaps[number - 1]
+            }
+            for number in rng.sample(range(1, holes + 1), holes)
+        ]
+    }
+
+
+def create(db_service: DatabaseService, payload: dict):
+    course = db_service.create_course(GolfCourseCreate.model_validate(payload))
+    GolfCourseResponse(success=True, message="created", data=course).model_dump_json()
+    return course.id
+
+
+def update(db_service: DatabaseService, course_id, payload: dict):
+    course = db_service.update_course(course_id, GolfCourseUpdate.model_validate(payload))
+    GolfCourseResponse(success=True, message="updated", data=course).model_dump_json()
+
+
+def summarize(label: str, timings, allocations):
+    timings_ms = sorted(t * 1000 for t in timings)
+    p95 = timings_ms[int(len(timings_ms) * 0.95) - 1]
+    print(
+        f"{label:<16} mean {statistics.mean(timings_ms):7.3f}ms  p50 {statistics.median(timings_ms):7.3f}ms  "
+        f"p95 {p95:7.3f}ms  peak alloc {statistics.mean(p for p, _ in allocations) / 1024:7.1f}KiB  "
+        f"retained {statistics.mean(r for _, r in allocations) / 1024:6.1f}KiB"
+    )
+
+
+def run(operation, iterations: int):
+    """Time ``operation`` over ``iterations`` calls, then re-run under tracemalloc"""
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        operation(i)
+        timings.append(time.perf_counter() - started)
+
+    allocations = []
+    tracemalloc.start()
+    for i in range(iterations, iterations + min(iterations, 100)):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        operation(i)
+        after, peak = tracemalloc.get_traced_memory()
+        allocations.append((peak - before, after - before))
+    tracemalloc.stop()
+    return timings, allocations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    scratch.close()
+    engine = create_engine(f"sqlite:///{scratch.name}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    db_service = DatabaseService(db)
+    rng = random.Random(42)
+
+    course_ids = []
+    timings, allocations = run(lambda i: course_ids.append(create(db_service, course_payload(rng))), args.iterations)
+    summarize("create", timings, allocations)
+
+    timings, allocations = run(
+        lambda i: update(db_service, course_ids[i % len(course_ids)], {"name": f"Renamed {i}"}), args.iterations
+    )
+    summarize("update (fields)", timings, allocations)
+
+    timings, allocations = run(
+        lambda i: update(db_service, course_ids[i % len(course_ids)], course_payload(rng)), args.iterations
+    )
+    summarize("update (holes)", timings, allocations)
+
+    db.close()
+    os.remove(scratch.name)
+
+
+if __name__ == "__main__":
+    main()
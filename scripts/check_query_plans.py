@@ -0,0 +1,317 @@
+"""Check that every DatabaseService access path uses its expected index.
+
+Each check runs a service call against a scratch database, captures the SQL it
+issues, runs every statement through EXPLAIN and verifies which index (or
+primary key) each table is read through, and that no statement sorts its rows
+outside an index. A change that silently turns an indexed lookup into a full
+scan or adds a sort makes the script exit non-zero, so it can run in CI.
+
+SQLite is used by default. Pass --database-url to check PostgreSQL as well;
+the tables are created and filled in that database, so point it at a
+disposable one. Sequential scans are disabled for the EXPLAIN on PostgreSQL so
+the planner's choice on tiny tables reflects which indexes are usable.
+
+Usage:
+    python scripts/check_query_plans.py [--database-url postgresql://...] [--verbose]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import date
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database_new import DatabaseService
+from app.db_models import Base, RoundDB
+from app.ingestion import RoundIngestionBuffer
+from app.models import GolfCourseCreate, GolfCourseUpdate, Hole
+
+PRIMARY_KEY = "<primary key>"
+FULL_SCAN = "<full scan>"
+# Reported as a pseudo-table for SQLite temp B-trees and PostgreSQL Sort nodes
+SORT = "<sort>"
+
+HOLES_BY_COURSE = "ix_holes_golf_course_id_hole_number"
+CHANGES_BY_COURSE = "ix_course_changes_course_id"
+
+
+class Check(NamedTuple):
+    name: str
+    run: Callable[[DatabaseService, Dict], object]
+    # Allowed access paths per table; any table read without an entry fails,
+    # and so does any sort unless listed as {SORT: {SORT}}
+    expected: Dict[str, Set[str]]
+
+
+CHECKS = [
+    Check(
+        "get_course_by_id",
+        lambda svc, ctx: svc.get_course_by_id(ctx["course_id"]),
+        {"golf_courses": {PRIMARY_KEY}, "holes": {HOLES_BY_COURSE}},
+    ),
+    Check(
+        "get_all_courses",
+        lambda svc, ctx: svc.get_all_courses(),
+        {"golf_courses": {FULL_SCAN}, "holes": {HOLES_BY_COURSE}},
+    ),
+    Check(
+        "get_courses_page",
+        lambda svc, ctx: svc.get_courses_page(("Augusta National Golf Club", ctx["course_id"]), limit=2),
+        {"golf_courses": {"ix_golf_courses_name_id"}, "holes": {HOLES_BY_COURSE}},
+    ),
+    Check(
+        "search_courses (substring, scan expected)",
+        lambda svc, ctx: svc.search_courses("national"),
+        {"golf_courses": {FULL_SCAN}, "holes": {HOLES_BY_COURSE}},
+    ),
+    Check(
+        "get_courses_by_country",
+        lambda svc, ctx: svc.get_courses_by_country("Germany"),
+        {"golf_courses": {"ix_golf_courses_country_name"}, "holes": {HOLES_BY_COURSE}},
+    ),
+    Check(
+        "get_courses_by_name_prefix",
+        lambda svc, ctx: svc.get_courses_by_name_prefix("Aug"),
+        {"golf_courses": {"ix_golf_courses_lower_name"}, "holes": {HOLES_BY_COURSE}},
+    ),
+    Check(
+        "update_course (fields)",
+        lambda svc, ctx: svc.update_course(ctx["course_id"], GolfCourseUpdate(name="Renamed Course")),
+        {"golf_courses": {PRIMARY_KEY}, "holes": {HOLES_BY_COURSE}, "course_changes": {CHANGES_BY_COURSE}},
+    ),
+    Check(
+        "update_course (holes)",
+        lambda svc, ctx: svc.update_course(ctx["course_id"], GolfCourseUpdate(holes=ctx["holes"])),
+        {"golf_courses": {PRIMARY_KEY}, "holes": {HOLES_BY_COURSE}, "course_changes": {CHANGES_BY_COURSE}},
+    ),
+    Check(
+        "get_changes_since",
+        lambda svc, ctx: svc.get_changes_since(1, limit=10),
+        {"course_changes": {PRIMARY_KEY}, "golf_courses": {PRIMARY_KEY}, "holes": {HOLES_BY_COURSE}},
+    ),
+    Check(
+        "get_round_by_id",
+        lambda svc, ctx: svc.get_round_by_id(ctx["round_id"]),
+        {"rounds": {PRIMARY_KEY}},
+    ),
+    Check(
+        "get_course_rounds",
+        lambda svc, ctx: svc.get_course_rounds(ctx["course_id"], limit=10),
+        {"rounds": {"ix_rounds_golf_course_id_net"}},
+    ),
+    Check(
+        "ingestion course layout",
+        lambda svc, ctx: RoundIngestionBuffer(ctx["session_factory"]).get_layout(ctx["course_id"]),
+        {"holes": {HOLES_BY_COURSE}},
+    ),
+    Check(
+        "delete_course",
+        lambda svc, ctx: svc.delete_course(ctx["delete_course_id"]),
+        {
+            "golf_courses": {PRIMARY_KEY},
+            "holes": {HOLES_BY_COURSE, PRIMARY_KEY},
+            "rounds": {"ix_rounds_golf_course_id_net"},
+            "course_changes": {CHANGES_BY_COURSE},
+        },
+    ),
+]
+
+
+def sample_holes(count: int = 18) -> List[Hole]:
+    return [
+        Hole(hole_number=n, par=3 + n % 3, distance_meters=100 + 20 * n, handicap=n)
+        for n in range(1, count + 1)
+    ]
+
+
+def seed(engine: Engine) -> Dict:
+    """Create the schema and a small data set the checks can address"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_factory()
+    try:
+        svc = DatabaseService(db)
+        courses = [
+            svc.create_course(GolfCourseCreate(
+                name=name, location="Somewhere", country=country, total_holes=18, holes=sample_holes()
+            ))
+            for name, country in [
+                ("Augusta National Golf Club", "United States"),
+                ("Golf-Club Bad Kissingen", "Germany"),
+                ("St Andrews Old Course", "Scotland"),
+                ("Course To Delete", "Germany"),
+            ]
+        ]
+        round_id = uuid4()
+        db.execute(insert(RoundDB), [{
+            "id": round_id,
+            "golf_course_id": courses[0].id,
+            "player_name": "Check Player",
+            "played_on": date.today(),
+            "course_handicap": 10,
+            "strokes": bytes([4] * 18),
+            "gross": 72,
+            "net": 62,
+            "score_to_par": 0,
+        }])
+        db.commit()
+    finally:
+        db.close()
+
+    return {
+        "course_id": courses[0].id,
+        "delete_course_id": courses[-1].id,
+        "round_id": round_id,
+        "holes": sample_holes(),
+        "session_factory": session_factory,
+    }
+
+
+def explain(engine: Engine, statement: str, parameters) -> List[Tuple[str, Optional[str]]]:
+    """Return (table, access path) pairs for every table read by a statement"""
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            accesses = []
+            for row in rows:
+                if re.match(r"(SCAN|SEARCH) ", row[3]):
+                    accesses.append(parse_sqlite_detail(row[3]))
+                elif row[3].startswith("USE TEMP B-TREE"):
+                    accesses.append((SORT, row[3]))
+            return accesses
+
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+        conn.rollback()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        accesses = []
+        walk_postgres_plan(plan[0]["Plan"], accesses)
+        return accesses
+
+
+def parse_sqlite_detail(detail: str) -> Tuple[str, Optional[str]]:
+    match = re.match(r"(?:SCAN|SEARCH) (\w+)(?: AS \w+)?(.*)", detail)
+    table, rest = match.group(1), match.group(2)
+    index = re.search(r"USING (?:COVERING )?INDEX (\w+)", rest)
+    if index:
+        name = index.group(1)
+        return table, PRIMARY_KEY if name.startswith("sqlite_autoindex_") else name
+    if "PRIMARY KEY" in rest:
+        return table, PRIMARY_KEY
+    return table, None
+
+
+def walk_postgres_plan(node: Dict, accesses: List[Tuple[str, Optional[str]]]):
+    relation = node.get("Relation Name")
+    if node["Node Type"] in ("Sort", "Incremental Sort"):
+        accesses.append((SORT, node["Node Type"]))
+    if relation:
+        if "Index Name" in node:
+            name = node["Index Name"]
+            accesses.append((relation, PRIMARY_KEY if name == f"{relation}_pkey" else name))
+        elif node["Node Type"] == "Bitmap Heap Scan":
+            for name in bitmap_index_names(node):
+                accesses.append((relation, PRIMARY_KEY if name == f"{relation}_pkey" else name))
+        else:
+            accesses.append((relation, None))
+    for child in node.get("Plans", []):
+        if child["Node Type"] not in ("Bitmap Index Scan", "BitmapOr", "BitmapAnd"):
+            walk_postgres_plan(child, accesses)
+
+
+def bitmap_index_names(node: Dict) -> List[str]:
+    names = []
+    for child in node.get("Plans", []):
+        if "Index Name" in child:
+            names.append(child["Index Name"])
+        names.extend(bitmap_index_names(child))
+    return names
+
+
+def run_checks(database_url: str, verbose: bool) -> bool:
+    engine = create_engine(database_url)
+    context = seed(engine)
+    captured: List[Tuple[str, object]] = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            captured.append((statement, parameters))
+
+    print(f"Checking query plans on {engine.dialect.name}")
+    all_passed = True
+    for check in CHECKS:
+        captured.clear()
+        db = context["session_factory"]()
+        try:
+            check.run(DatabaseService(db), context)
+        finally:
+            db.close()
+
+        statements = list(captured)
+        captured.clear()
+        failures = []
+        plans = []
+        for statement, parameters in statements:
+            for table, access in explain(engine, statement, parameters):
+                if table == SORT:
+                    plans.append(f"sort: {access}")
+                    if SORT not in check.expected:
+                        failures.append(f"rows sorted outside an index ({access})")
+                    continue
+                allowed = check.expected.get(table, set())
+                label = access or FULL_SCAN
+                plans.append(f"{table}: {label}")
+                if FULL_SCAN not in allowed and access not in allowed:
+                    expected = ", ".join(sorted(allowed)) or "no access"
+                    failures.append(f"{table} read via {label}, expected {expected}")
+
+        passed = not failures and bool(statements)
+        all_passed = all_passed and passed
+        print(f"  {'PASS' if passed else 'FAIL'}  {check.name}")
+        if not statements:
+            print("        no statements captured")
+        for failure in failures:
+            print(f"        {failure}")
+        if verbose:
+            for plan in plans:
+                print(f"        {plan}")
+
+    event.remove(engine, "before_cursor_execute", capture)
+    return all_passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None, help="Database to check instead of a scratch SQLite file")
+    parser.add_argument("--verbose", action="store_true", help="Print every table access")
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    scratch = None
+    if database_url is None:
+        scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        scratch.close()
+        database_url = f"sqlite:///{scratch.name}"
+
+    try:
+        passed = run_checks(database_url, args.verbose)
+    finally:
+        if scratch is not None:
+            os.remove(scratch.name)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
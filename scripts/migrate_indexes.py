@@ -0,0 +1,98 @@
+"""Add the indexes declared on the models to an existing database.
+
+``create_tables`` only creates missing tables, so databases created before an
+index was declared never get it. This migration creates every declared index
+that is missing (concurrently on PostgreSQL, so writes are not blocked),
+rebuilds PostgreSQL indexes that were created before they were declared with
+the "C" collation, and drops the single-column indexes the composite ones
+replaced. It is idempotent.
+
+Usage:
+    DATABASE_URL=postgresql://... python scripts/migrate_indexes.py [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from app.database_new import engine
+from app.db_models import Base
+
+# Superseded by a composite index with the same leading column
+REDUNDANT_INDEXES = {
+    "golf_courses": ["ix_golf_courses_country", "ix_golf_courses_name"],
+    "rounds": ["ix_rounds_golf_course_id"],
+}
+
+
+def existing_indexes():
+    """Definitions of all indexes in the database, by name.
+
+    Queried from the catalog because the SQLite inspector skips expression
+    indexes such as ``lower(name)``.
+    """
+    if engine.dialect.name == "sqlite":
+        query = "SELECT name, sql FROM sqlite_master WHERE type = 'index'"
+    elif engine.dialect.name == "postgresql":
+        query = "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema()"
+    else:
+        raise RuntimeError(f"Unsupported database dialect: {engine.dialect.name}")
+    with engine.connect() as conn:
+        return {row[0]: row[1] or "" for row in conn.execute(text(query))}
+
+
+def needs_rebuild(index, definition: str) -> bool:
+    """Whether an existing index lacks the "C" collation it is now declared with"""
+    declared = str(CreateIndex(index).compile(dialect=engine.dialect))
+    return 'COLLATE "C"' in declared and 'COLLATE "C"' not in definition
+
+
+def migrate(dry_run: bool = False):
+    inspector = inspect(engine)
+    postgres = engine.dialect.name == "postgresql"
+    existing = existing_indexes()
+    statements = []
+
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue  # New tables get their indexes from create_tables
+
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name in existing:
+                if not (postgres and needs_rebuild(index, existing[index.name])):
+                    continue
+                statements.append(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+            if postgres:
+                index.dialect_options["postgresql"]["concurrently"] = True
+            statements.append(CreateIndex(index, if_not_exists=True))
+
+        for name in REDUNDANT_INDEXES.get(table.name, []):
+            if name in existing:
+                concurrently = "CONCURRENTLY " if postgres else ""
+                statements.append(text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
+
+    if not statements:
+        print("Indexes are up to date")
+        return
+
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in statements:
+            print(str(statement.compile(dialect=engine.dialect)).strip() + ";")
+            if not dry_run:
+                conn.execute(statement)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Print the DDL without executing it")
+    args = parser.parse_args()
+    migrate(dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Move golf courses to the shard that owns them after adding shards.
+
+Placement uses jump consistent hashing over the ordered shard list, so new
+shards must be appended to SHARD_DATABASE_URLS. After appending, run this
+tool with the new list: it scans every shard and moves each course whose
+owner changed (together with its holes and rounds) to the new owner. Only
+about 1/N of the courses move when one shard is added.
+
+Before running it, deploy the appended list to every API instance together
+with SHARD_MIGRATION_FROM set to the old shard count, and unset it once this
+tool has finished. Meanwhile the API reads courses that have not moved yet
+from their previous shard and refuses writes to them (503), so no update or
+round lands on a source copy after it has been copied.
+
+Each course is copied and committed on the target before it is deleted from
+the source, so an interrupted run can simply be restarted. Every shard keeps
+its own change log: a moved course is recorded as an upsert on the target and
+its entry is removed from the source, so change feed clients see it once.
+
+Usage:
+    SHARD_DATABASE_URLS='["sqlite:///./shard0.db", "sqlite:///./shard1.db", "sqlite:///./shard2.db"]' \\
+        python scripts/rebalance_shards.py [--dry-run] [--batch-size 500]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import delete, insert, select
+
+from app.config import get_settings
+from app.database_new import lock_change_log
+from app.db_models import CourseChangeDB, GolfCourseDB, HoleDB, RoundDB
+from app.sharding import ShardRouter
+
+# Parent first for inserts; reversed for deletes
+COURSE_TABLES = [
+    (GolfCourseDB.__table__, GolfCourseDB.__table__.c.id),
+    (HoleDB.__table__, HoleDB.__table__.c.golf_course_id),
+    (RoundDB.__table__, RoundDB.__table__.c.golf_course_id),
+]
+
+
+def misplaced_courses(router: ShardRouter, shard: int, batch_size: int):
+    """Yield batches of course IDs on ``shard`` that belong elsewhere.
+
+    Pages through the IDs with keyset queries, each on its own short-lived
+    connection, so no read cursor stays open on the source while the caller
+    moves a batch and commits its deletes (on SQLite that fails with
+    "database is locked").
+    """
+    after = None
+    while True:
+        query = select(GolfCourseDB.id).order_by(GolfCourseDB.id).limit(batch_size)
+        if after is not None:
+            query = query.where(GolfCourseDB.id > after)
+        with router.engines[shard].connect() as conn:
+            page = list(conn.execute(query).scalars())
+        if not page:
+            return
+        after = page[-1]
+        batch = [course_id for course_id in page if router.shard_for(course_id) != shard]
+        if batch:
+            yield batch
+
+
+def move_courses(router: ShardRouter, source: int, course_ids) -> int:
+    """Copy courses to their owners, then remove them from ``source``"""
+    by_target = {}
+    for course_id in course_ids:
+        by_target.setdefault(router.shard_for(course_id), []).append(course_id)
+
+    with router.engines[source].connect() as source_conn:
+        for target, ids in by_target.items():
+            with router.engines[target].begin() as target_conn:
+                # Skip courses already copied by an interrupted run
+                present = set(target_conn.execute(
+                    select(GolfCourseDB.id).where(GolfCourseDB.id.in_(ids))
+                ).scalars())
+                to_copy = [course_id for course_id in ids if course_id not in present]
+                for table, course_column in COURSE_TABLES:
+                    if not to_copy:
+                        break
+                    rows = [dict(row._mapping) for row in source_conn.execute(
+                        select(table).where(course_column.in_(to_copy))
+                    )]
+                    if rows:
+                        target_conn.execute(insert(table), rows)
+                if to_copy:
+                    lock_change_log(target_conn)
+                    target_conn.execute(delete(CourseChangeDB).where(CourseChangeDB.course_id.in_(to_copy)))
+                    target_conn.execute(insert(CourseChangeDB), [
+                        {"course_id": course_id, "operation": "upsert"} for course_id in to_copy
+                    ])
+
+        for table, course_column in reversed(COURSE_TABLES):
+            source_conn.execute(delete(table).where(course_column.in_(course_ids)))
+        source_conn.execute(delete(CourseChangeDB).where(CourseChangeDB.course_id.in_(course_ids)))
+        source_conn.commit()
+
+    return len(course_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many courses would move")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    urls = get_settings().shard_database_urls
+    if not urls:
+        parser.error("SHARD_DATABASE_URLS is not set")
+
+    router = ShardRouter(urls)
+    router.create_tables()
+
+    total = 0
+    for shard in range(router.num_shards):
+        moved = 0
+        for batch in misplaced_courses(router, shard, args.batch_size):
+            moved += len(batch) if args.dry_run else move_courses(router, shard, batch)
+        total += moved
+        print(f"shard {shard}: {'would move' if args.dry_run else 'moved'} {moved} courses")
+    print(f"total: {total} courses")
+
+
+if __name__ == "__main__":
+    main()